@@ -1,13 +1,36 @@
 import streamlit as st
 import pandas as pd
+import atexit
 import datetime
+import itertools
 import os
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+from auth import CredentialStore, hash_password, migrate_passwords, needs_rehash, plaintext_passwords
+from importer import default_values, import_applicants
+from indexes import BdmIndex, Change, PipelineCounts, RowIndex, SearchIndex
+from metrics import BUCKETS, metrics, span, timed
+from storage import (APPLICANT_COLUMNS, DIPLOMA_OPTIONS, VISA_TYPES, ApplicantStore,
+                     StorageError, Ticket, WriteBehind, append_applicants, file_lock, flush_pending,
+                     latest_signature, open_applicant_store, parse_applicant_id, pending_path,
+                     read_latest_excel, save_pending, set_applicant_values, to_cell)
 
 # File paths
-APPLICANTS_FILE = "onms_applicants.xlsx"
+APPLICANTS_FILE = "onms_applicants.xlsx"  # Import/export snapshot of the applicant book
+APPLICANTS_DB = "onms_applicants.db"
 USERS_FILE = "onms_users.xlsx"
 
+# "sqlite" (default) keeps applicants in APPLICANTS_DB; "excel" keeps the old
+# behaviour of rewriting APPLICANTS_FILE on every change.
+STORAGE_BACKEND = os.environ.get("ONMS_STORAGE", "sqlite")
+COMPACTION_INTERVAL = 60  # Seconds between background folds of the write log
+# Keep a Parquet copy of the applicant table next to the store for fast cold
+# starts (needs pyarrow), optionally memory-mapped when it is read.
+COLUMNAR_SNAPSHOT = os.environ.get("ONMS_COLUMNAR_SNAPSHOT", "1") == "1"
+SNAPSHOT_MEMORY_MAP = os.environ.get("ONMS_SNAPSHOT_MMAP", "0") == "1"
+WRITE_DELAY = 0.2  # Seconds the background writer waits for more saves to the same file
+
 # Initialize session state
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
@@ -23,76 +46,456 @@ if 'user_form_submitted' not in st.session_state:
     st.session_state.user_form_submitted = False  # For User Management
 
 # Load and save functions
-def load_applicants() -> pd.DataFrame:
-    if os.path.exists(APPLICANTS_FILE):
-        df = pd.read_excel(APPLICANTS_FILE)
-        required_cols = ['Name', 'Contact_Number', 'Address', 'ID_Number', 'Email_Address', 
-                         'Country_of_Interest', 'Type_of_Visa', 'Education_Level', 'Diploma', 
-                         'Work_Experience', 'Current_Job', 'Travel_History', 'Any_Refusal', 
-                         'Signature', 'Date', 'BDM_Name', 'Entered_By']
-        for col in required_cols:
-            if col not in df.columns:
-                df[col] = ''
-        df = df.fillna('')  # Fill NaN with empty strings
-        df['ID_Number'] = df['ID_Number'].astype(str)  # Ensure ID_Number is string
+USER_COLUMNS = ['Username', 'Password', 'Role']
+
+# Process-wide cache of loaded tables, shared by every session on this server.
+# Each entry carries the signature of the data it was built from (file mtime
+# and size, or the store's revision), so a change made elsewhere is picked up
+# on the next rerun. Our own writes patch the entry in place instead (see
+# patch). Entries are evicted least-recently-used once either limit is
+# exceeded, and callers always receive a copy so they never see a patch
+# half-applied.
+# Row labels depend on the frame's history (a patched delete leaves a gap that
+# a fresh load would not), so df.attrs['version'] is (signature, build), where
+# build numbers each frame read from disk and is kept through its patches.
+# Indexes and query caches keyed on it never mix labels from two frames.
+class TableCache:
+    def __init__(self, max_entries: int = 8, max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # name -> (signature, df, nbytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._builds = itertools.count()
+
+    def _lookup(self, name: str, signature: tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != signature:
+                return None
+            self._entries.move_to_end(name)
+            return entry[1].copy()
+
+    def get(self, name: str, signature: Callable[[], tuple], loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        df = self._lookup(name, signature())
+        if df is not None:
+            metrics.count('table_cache.hit')
+            return df
+        metrics.count('table_cache.miss')
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # Only one session loads a given table; the others wait and then hit.
+        with load_lock:
+            current = signature()
+            df = self._lookup(name, current)
+            if df is None:
+                df = loader()
+                # The entry is keyed on the version the rows were read at: the
+                # loader's df.attrs['version'] if it reports one, otherwise the
+                # signature, re-read until it holds still across a load.
+                version = df.attrs.get('version')
+                while version is None:
+                    after = signature()
+                    if after == current:
+                        version = current
+                    else:
+                        current, df = after, loader()
+                self._store(name, version, df)
+                df = df.copy()
         return df
-    return pd.DataFrame(columns=['Name', 'Contact_Number', 'Address', 'ID_Number', 'Email_Address', 
-                                 'Country_of_Interest', 'Type_of_Visa', 'Education_Level', 'Diploma', 
-                                 'Work_Experience', 'Current_Job', 'Travel_History', 'Any_Refusal', 
-                                 'Signature', 'Date', 'BDM_Name', 'Entered_By'])
 
+    # Apply one of our own writes to the cached entry: edit(df) -> (df, result)
+    # runs under the cache lock only if the entry is at the write's "before"
+    # version, and the entry moves to "after". Returns the frame's
+    # df.attrs['version'] before and after along with edit's result, or None
+    # if the entry was missing or stale (it is then dropped and reloaded).
+    def patch(self, name: str, before: tuple, after: tuple, edit: Callable) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != before:
+                self._discard(name)
+                return None
+            old_key = entry[1].attrs['version']
+            df, result = edit(entry[1])
+            df.attrs['version'] = (after, old_key[1])
+            self._entries[name] = (after, df, entry[2])
+            return old_key, df.attrs['version'], result
+
+    def _store(self, name: str, signature: tuple, df: pd.DataFrame) -> None:
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        df.attrs['version'] = (signature, next(self._builds))
+        with self._lock:
+            self._discard(name)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[name] = (signature, df, nbytes)
+            self._total_bytes += nbytes
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, name: str) -> None:
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self._total_bytes -= entry[2]
+
+    def invalidate(self, name: str) -> None:
+        with self._lock:
+            self._discard(name)
+
+@st.cache_resource
+def get_table_cache() -> TableCache:
+    return TableCache()
+
+@st.cache_resource
+def get_applicant_store() -> ApplicantStore:
+    store = open_applicant_store(STORAGE_BACKEND, APPLICANTS_DB, APPLICANTS_FILE,
+                                 COLUMNAR_SNAPSHOT, SNAPSHOT_MEMORY_MAP)
+    store.start_compaction(COMPACTION_INTERVAL)
+    return store
+
+@st.cache_resource
+def get_bdm_index() -> BdmIndex:
+    return BdmIndex()
+
+@st.cache_resource
+def get_search_index() -> SearchIndex:
+    return SearchIndex()
+
+@st.cache_resource
+def get_pipeline_counts() -> PipelineCounts:
+    return PipelineCounts()
+
+def applicant_indexes() -> List[RowIndex]:
+    return [get_bdm_index(), get_search_index(), get_pipeline_counts()]
+
+@timed()
+def load_applicants() -> pd.DataFrame:
+    store = get_applicant_store()
+    df = get_table_cache().get('applicants', store.version, store.load_all)
+    for index in applicant_indexes():
+        index.sync(df)
+    return df
+
+@st.cache_resource
+def get_credential_store() -> CredentialStore:
+    migrate_user_passwords()
+    return CredentialStore(lambda: latest_signature(USERS_FILE), load_users)
+
+@timed()
 def load_users() -> pd.DataFrame:
-    if os.path.exists(USERS_FILE):
-        return pd.read_excel(USERS_FILE)
-    return pd.DataFrame(columns=['Username', 'Password', 'Role'])
+    if latest_signature(USERS_FILE) is not None:
+        return get_table_cache().get(USERS_FILE, lambda: latest_signature(USERS_FILE),
+                                     lambda: read_latest_excel(USERS_FILE))
+    return pd.DataFrame(columns=USER_COLUMNS)
+
+# Whole-workbook rewrites run on one background writer thread. save_data
+# returns once the change is durably recorded next to the workbook (see
+# save_pending), which is also what every later read sees; the slow rewrite
+# follows, and saves to the same file that arrive together are written once.
+# Each session keeps the tickets of its saves and is told on its next rerun
+# when they are written or if writing failed (see show_write_status). The queue
+# is drained when the server exits.
+@st.cache_resource
+def get_writer() -> WriteBehind:
+    writer = WriteBehind(delay=WRITE_DELAY)
+    writer.start()
+    atexit.register(writer.close)
+    for filepath in (USERS_FILE, APPLICANTS_FILE):
+        if os.path.exists(pending_path(filepath)):  # Left behind by a crash before its flush
+            writer.submit(filepath, lambda filepath=filepath: flush_pending(filepath))
+    return writer
+
+def track_write(ticket: Ticket, label: str) -> None:
+    st.session_state.setdefault('pending_writes', []).append((ticket, label))
 
-def save_data(df: pd.DataFrame, filepath: str) -> bool:
+def show_write_status() -> None:
+    waiting, written = [], set()
+    for ticket, label in st.session_state.get('pending_writes', []):
+        state, error = get_writer().status(ticket)
+        if state == 'written':
+            written.add(label)
+            continue
+        if state == 'failed':
+            st.sidebar.error(f"Writing {label} failed: {error}. It will be retried.")
+        waiting.append((ticket, label))
+    for label in sorted(written):
+        st.toast(f"{label} written.")
+    if waiting:
+        st.sidebar.caption(f"{len(waiting)} change(s) being written in the background.")
+    st.session_state.pending_writes = waiting
+
+@timed()
+def save_data(df: pd.DataFrame, filepath: str, wait: bool = False) -> bool:
     try:
-        df.to_excel(filepath, index=False)
-        return True
+        save_pending(df, filepath)
+        ticket = get_writer().submit(filepath, lambda: flush_pending(filepath))
     except Exception as e:
         st.error(f"Failed to save data: {str(e)}")
         return False
+    finally:
+        get_table_cache().invalidate(filepath)
+    if not wait:
+        track_write(ticket, filepath)
+        return True
+    state, error = get_writer().wait(ticket)
+    if state == 'failed':
+        st.error(f"Failed to save data: {error}")
+    return state == 'written'
 
-# Function to generate a unique ID_Number
-def generate_unique_id(applicants_df: pd.DataFrame) -> str:
-    prefix = "ONMS"
-    if applicants_df.empty or 'ID_Number' not in applicants_df.columns or applicants_df['ID_Number'].str.strip().eq('').all():
-        return f"{prefix}0001"
-    else:
-        valid_ids = applicants_df['ID_Number'].dropna().astype(str)
-        valid_ids = valid_ids[valid_ids.str.startswith(prefix)]
-        if valid_ids.empty:
-            return f"{prefix}0001"
-        numeric_parts = valid_ids.str.replace(prefix, '', regex=False).astype(int)
-        next_id = numeric_parts.max() + 1
-        return f"{prefix}{next_id:04d}"  # Ensures 4-digit padding
+# User changes re-read the workbook while holding its lock, so two Masters
+# editing users at the same time both keep their change.
+@timed()
+def add_user(username: str, password: str, role: str) -> bool:
+    with file_lock(USERS_FILE):
+        users_df = load_users()
+        if username in users_df['Username'].values:
+            st.error("Username already exists!")
+            return False
+        new_user = pd.DataFrame({'Username': [username], 'Password': [hash_password(password)], 'Role': [role]})
+        saved = save_data(pd.concat([users_df, new_user], ignore_index=True), USERS_FILE)
+    get_credential_store().invalidate()
+    return saved
+
+@timed()
+def delete_user(username: str) -> bool:
+    with file_lock(USERS_FILE):
+        users_df = load_users()
+        saved = save_data(users_df[users_df['Username'] != username], USERS_FILE)
+    get_credential_store().invalidate()
+    return saved
+
+# Passwords written before they were hashed are hashed in one pass when the
+# server starts; any that appear later (a hand-edited workbook) still log in and
+# are rehashed then, as are hashes made with older cost settings.
+def migrate_user_passwords() -> None:
+    if not os.path.exists(USERS_FILE):
+        return
+    with file_lock(USERS_FILE):
+        users_df = load_users()
+        if plaintext_passwords(users_df).any():
+            save_data(migrate_passwords(users_df), USERS_FILE)
+
+def rehash_password(username: str, password: str) -> None:
+    with file_lock(USERS_FILE):
+        users_df = load_users()
+        users_df['Password'] = users_df['Password'].astype(object)
+        users_df.loc[users_df['Username'] == username, 'Password'] = hash_password(password)
+        save_data(users_df, USERS_FILE)
+    get_credential_store().invalidate()
+
+# Generate unique ID_Numbers from the store's persistent sequence
+def generate_unique_id() -> str:
+    return get_applicant_store().allocate_ids(1)[0]
 
 # Authentication
+@timed()
 def authenticate(username: str, password: str) -> Optional[str]:
-    users_df = load_users()
-    user = users_df[(users_df['Username'] == username) & (users_df['Password'] == password)]
-    if not user.empty:
-        return user.iloc[0]['Role']
-    return None
+    credential = get_credential_store().authenticate(username, password)
+    if credential is None:
+        return None
+    if needs_rehash(credential.password):
+        rehash_password(username, password)
+    return credential.role
 
 # CRUD Operations
+# Each operation writes the affected rows to the store, applies the same change
+# to the shared cached table and its indexes, and returns a copy of the updated
+# table for the rest of the rerun. Storage failures surface as StorageError.
+def _commit_change(versions: tuple, edit: Callable) -> pd.DataFrame:
+    patched = get_table_cache().patch('applicants', *versions, edit)
+    before, after, changes = patched if patched is not None else (None, None, None)
+    for index in applicant_indexes():
+        index.apply(before, after, changes)
+    return load_applicants()
+
+def _labels_for_id(df: pd.DataFrame, id_number: str, version: tuple) -> list:
+    labels = get_search_index().labels_for_id(id_number, version)
+    if labels is None:
+        labels = list(df.index[df['ID_Number'] == id_number])
+    return labels
+
+# Writes are keyed on ID_Number, which the store keeps unique (see
+# ensure_unique_ids); an ID that still matches several rows is refused rather
+# than written to all of them.
+def _check_single_row(df: pd.DataFrame, id_number: str) -> None:
+    count = len(_labels_for_id(df, id_number, df.attrs.get('version')))
+    if count > 1:
+        raise StorageError(f"ID_Number {id_number!r} matches {count} applicants; nothing was changed")
+
+def _update_rows(df: pd.DataFrame, labels: list, values: dict) -> List[Change]:
+    rows = df.loc[labels].to_dict('records')  # One frame slice, not a row lookup per label
+    changes = [Change('update', label, old, dict(old, **values)) for label, old in zip(labels, rows)]
+    set_applicant_values(df, labels, values)
+    return changes
+
+@timed()
 def create_applicant(applicants_df: pd.DataFrame, new_data: dict) -> pd.DataFrame:
-    new_applicant = pd.DataFrame([new_data])
-    return pd.concat([applicants_df, new_applicant], ignore_index=True)
+    row = {col: to_cell(new_data.get(col, '')) for col in APPLICANT_COLUMNS}
+
+    def edit(df):
+        label = df.index.max() + 1 if len(df) else 0
+        return append_applicants(df, pd.DataFrame([row], index=[label])), [Change('insert', label, None, row)]
+    return _commit_change(get_applicant_store().insert(new_data), edit)
 
+@timed()
 def read_applicants(applicants_df: pd.DataFrame, bdm_name: str = None) -> pd.DataFrame:
     if bdm_name:
+        labels = get_bdm_index().labels(bdm_name, applicants_df.attrs.get('version'))
+        if labels is not None:
+            return applicants_df.loc[labels]
         return applicants_df[applicants_df['BDM_Name'] == bdm_name]
     return applicants_df
 
+@timed()
 def update_applicant(applicants_df: pd.DataFrame, index: int, updated_data: dict) -> pd.DataFrame:
-    for key, value in updated_data.items():
-        applicants_df.at[index, key] = value
-    return applicants_df
+    id_number = applicants_df.at[index, 'ID_Number']
+    values = {key: to_cell(value) for key, value in updated_data.items() if key in APPLICANT_COLUMNS}
+    _check_single_row(applicants_df, id_number)
+
+    versions = get_applicant_store().update(id_number, updated_data)
+
+    def edit(df):
+        return df, _update_rows(df, _labels_for_id(df, id_number, df.attrs['version']), values)
+    return _commit_change(versions, edit)
+
+@timed()
+def delete_applicant(applicants_df: pd.DataFrame, id_number: str) -> pd.DataFrame:
+    _check_single_row(applicants_df, id_number)
+    versions = get_applicant_store().delete(id_number)
+
+    def edit(df):
+        labels = _labels_for_id(df, id_number, df.attrs['version'])
+        changes = [Change('delete', label, df.loc[label].to_dict(), None) for label in labels]
+        return df.drop(labels), changes
+    return _commit_change(versions, edit)
+
+# Bulk import goes through the store in a single write, so rather than patching
+# the cache row by row the next load_applicants() sees the new version and
+# reloads, rebuilding the indexes once.
+@timed()
+def bulk_import_applicants(applicants_df: pd.DataFrame, uploaded_file, defaults: dict,
+                           progress: Optional[Callable] = None) -> tuple:
+    known_bdms = set(load_users()['Username'])
+    report = import_applicants(uploaded_file, uploaded_file.name, get_applicant_store(), applicants_df,
+                               defaults, known_bdms, progress)
+    return load_applicants(), report
+
+@timed()
+def reassign_applicants(applicants_df: pd.DataFrame, old_bdm: str, new_bdm: str) -> pd.DataFrame:
+    versions = get_applicant_store().reassign_bdm(old_bdm, new_bdm)
+
+    def edit(df):
+        labels = get_bdm_index().labels(old_bdm, df.attrs['version'])
+        if labels is None:
+            labels = list(df.index[df['BDM_Name'] == old_bdm])
+        return df, _update_rows(df, labels, {'BDM_Name': new_bdm})
+    return _commit_change(versions, edit)
+
+# Applicant picker for the Update and Delete tabs: a search box over name,
+# email, phone and ID backed by the search index, and a selectbox of the top
+# matches keyed by ID_Number. Returns the chosen row's label.
+SEARCH_RESULTS = 20
+
+def select_applicant(label: str, key: str, applicants_df: pd.DataFrame) -> Optional[int]:
+    version = applicants_df.attrs.get('version')
+    query = st.text_input("Search by name, email, phone or ID", key=f"{key}_search")
+    if not query:
+        labels = list(applicants_df.index[-SEARCH_RESULTS:][::-1])  # Most recent entries
+    else:
+        labels = get_search_index().search(query, version, SEARCH_RESULTS)
+        if labels is None:
+            matches = applicants_df['Name'].str.contains(query, case=False, regex=False)
+            labels = list(applicants_df.index[matches][:SEARCH_RESULTS])
+    if not labels:
+        return None
+    options = applicants_df.loc[labels, ['ID_Number', 'Name']]
+    names = {}
+    for id_number, name in zip(options['ID_Number'], options['Name']):
+        names.setdefault(id_number, []).append(name)
+    id_number = st.selectbox(label, list(names), format_func=lambda i: f"{i} - {' / '.join(names[i])}",
+                             key=f"{key}_id")
+    matches = _labels_for_id(applicants_df, id_number, version)
+    if len(matches) > 1:
+        st.error(f"ID {id_number} is shared by {len(matches)} applicants and can't be changed until the IDs are made unique.")
+        return None
+    return matches[0]
+
+# Dashboard queries
+# Results are cached per table version, so repeat views, paging and other
+# sessions looking at the same filters skip the work. The frame is passed with a
+# leading underscore so Streamlit keys the cache on the version, not the data.
+DASHBOARD_COLUMNS = ['ID_Number', 'Name', 'Contact_Number', 'Email_Address', 'Country_of_Interest',
+                     'Type_of_Visa', 'Date', 'BDM_Name']
+PAGE_SIZES = [25, 50, 100, 250]
+SORT_KEYS = {
+    'ID_Number': lambda ids: pd.to_numeric(ids.map(parse_applicant_id)),
+    'Date': lambda dates: pd.to_datetime(dates, errors='coerce'),
+}
 
-def delete_applicant(applicants_df: pd.DataFrame, name: str) -> pd.DataFrame:
-    return applicants_df[applicants_df['Name'] != name]
+@st.cache_data(max_entries=16, show_spinner=False)
+def distinct_values(version: tuple, column: str, _applicants_df: pd.DataFrame) -> list:
+    return sorted(value for value in _applicants_df[column].unique() if value != '')
+
+@st.cache_data(max_entries=64, show_spinner=False)
+@timed()
+def query_applicants(version: tuple, bdm_names: tuple, visa_types: tuple, countries: tuple,
+                     date_range: tuple, sort_by: str, ascending: bool, _applicants_df: pd.DataFrame) -> list:
+    df = _applicants_df
+    if bdm_names:
+        labels = []
+        for bdm_name in bdm_names:
+            found = get_bdm_index().labels(bdm_name, version)
+            if found is None:
+                labels = None
+                break
+            labels.extend(found)
+        df = df.loc[sorted(labels)] if labels is not None else df[df['BDM_Name'].isin(bdm_names)]
+    if visa_types:
+        df = df[df['Type_of_Visa'].isin(visa_types)]
+    if countries:
+        df = df[df['Country_of_Interest'].isin(countries)]
+    if date_range:
+        dates = pd.to_datetime(df['Date'], errors='coerce')
+        df = df[(dates >= pd.Timestamp(date_range[0])) & (dates <= pd.Timestamp(date_range[1]))]
+    if sort_by:
+        key = SORT_KEYS.get(sort_by, lambda values: values.astype(str).str.lower())
+        df = df.sort_values(sort_by, ascending=ascending, key=key, kind='stable', na_position='last')
+    return list(df.index)
+
+# Pipeline summary for Masters, read from the incrementally maintained counts,
+# so it costs the same however many applicants there are.
+PIPELINE_TOP = 10
+PIPELINE_WEEKS = 12
+
+def pipeline_counts(applicants_df: pd.DataFrame, dimension: str) -> dict:
+    version = applicants_df.attrs.get('version')
+    counts = get_pipeline_counts().counts(dimension, version)
+    if counts is None:  # Counts describe another version; bring them to this one
+        get_pipeline_counts().sync(applicants_df)
+        counts = get_pipeline_counts().counts(dimension, version) or {}
+    return counts
+
+def top_counts(counts: dict, labels: dict = None) -> pd.Series:
+    top = sorted(counts.items(), key=lambda item: -item[1])[:PIPELINE_TOP]
+    return pd.Series({(labels or {}).get(key, key): n for key, n in top}, name="Applicants", dtype=int)
+
+def show_pipeline_summary(applicants_df: pd.DataFrame) -> None:
+    by_visa = pipeline_counts(applicants_df, 'Type_of_Visa')
+    st.metric("Applicants", sum(by_visa.values()))
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("By visa type")
+        st.bar_chart(top_counts(by_visa, {'': "(not set)"}))
+        st.write(f"By BDM (top {PIPELINE_TOP})")
+        st.bar_chart(top_counts(pipeline_counts(applicants_df, 'BDM_Name'), {'': "(unassigned)"}))
+    with col2:
+        st.write(f"By country of interest (top {PIPELINE_TOP})")
+        st.bar_chart(top_counts(pipeline_counts(applicants_df, 'Country_of_Interest'), {'': "(not set)"}))
+        st.write(f"New applicants per week (last {PIPELINE_WEEKS})")
+        by_week = pipeline_counts(applicants_df, 'Week')
+        weeks = sorted(week for week in by_week if week)[-PIPELINE_WEEKS:]
+        st.bar_chart(pd.Series({week: by_week[week] for week in weeks}, name="Applicants", dtype=int))
 
 # Main app
 def main():
@@ -113,6 +516,7 @@ def main():
         return
 
     st.title("ONMS Immigration CRM")
+    show_write_status()
     applicants_df = load_applicants()
     users_df = load_users()
 
@@ -123,27 +527,63 @@ def main():
 
     menu_options = ["Dashboard", "Manage Applicants"]
     if st.session_state.user_role == "Master":
-        menu_options.append("User Management")
+        menu_options += ["User Management", "Diagnostics"]
     choice = st.sidebar.selectbox("Menu", menu_options)
 
     # Dashboard (Read Operation)
+    # Filtering and sorting run on the server and only the visible page of the
+    # chosen columns is sent to the browser.
     if choice == "Dashboard":
         st.subheader("Dashboard")
-        if st.session_state.user_role == "Master":
-            st.write("All Applicants:")
-            st.dataframe(read_applicants(applicants_df))
-        else:
-            user_applicants = read_applicants(applicants_df, st.session_state.username)
-            if user_applicants.empty:
+        is_master = st.session_state.user_role == "Master"
+        version = applicants_df.attrs.get('version')
+        if is_master:
+            with st.expander("Pipeline summary", expanded=False), span('render.pipeline'):
+                show_pipeline_summary(applicants_df)
+        with st.expander("Filters", expanded=False):
+            col1, col2 = st.columns(2)
+            with col1:
+                visa_types = st.multiselect("Type of Visa", VISA_TYPES)
+                countries = st.multiselect("Country of Interest", distinct_values(version, 'Country_of_Interest', applicants_df))
+            with col2:
+                bdm_filter = st.multiselect("BDM Name", users_df['Username'].tolist() if not users_df.empty else []) if is_master else []
+                date_range = st.date_input("Date range", value=())
+            col1, col2, col3 = st.columns([2, 1, 1])
+            sort_by = col1.selectbox("Sort by", [""] + APPLICANT_COLUMNS, format_func=lambda col: col or "Entry order")
+            ascending = col2.radio("Order", ["Ascending", "Descending"]) == "Ascending"
+            page_size = col3.selectbox("Rows per page", PAGE_SIZES)
+            columns = st.multiselect("Columns", APPLICANT_COLUMNS, default=DASHBOARD_COLUMNS)
+
+        bdm_names = tuple(bdm_filter) if is_master else (st.session_state.username,)
+        labels = query_applicants(version, bdm_names, tuple(visa_types), tuple(countries),
+                                  tuple(date_range) if len(date_range) == 2 else (), sort_by, ascending, applicants_df)
+        if not labels:
+            if not is_master and not (visa_types or countries or date_range):
                 st.info("No applicants assigned to you.")
             else:
-                st.write("Your Assigned Applicants:")
-                st.dataframe(user_applicants)
+                st.info("No applicants match the selected filters.")
+        else:
+            page_count = (len(labels) - 1) // page_size + 1
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+            start = (page - 1) * page_size
+            end = min(start + page_size, len(labels))
+            st.write(f"{'All Applicants' if is_master else 'Your Assigned Applicants'} ({start + 1}-{end} of {len(labels)}):")
+            with span('render.dataframe'):  # Arrow serialization of the page
+                st.dataframe(applicants_df.loc[labels[start:end], columns or DASHBOARD_COLUMNS],
+                             column_config={"Date": st.column_config.DateColumn("Date")})
+        if is_master and st.button("Export to Excel"):
+            try:
+                store = get_applicant_store()
+                track_write(get_writer().submit('export:' + APPLICANTS_FILE,
+                                                lambda: store.export_excel(APPLICANTS_FILE)), APPLICANTS_FILE)
+                st.success(f"Exporting applicants to {APPLICANTS_FILE} in the background.")
+            except Exception as e:
+                st.error(f"Failed to export applicants: {str(e)}")
 
     # Manage Applicants (Create, Update, Delete Operations)
     elif choice == "Manage Applicants":
         st.subheader("Manage Applicants")
-        tabs = st.tabs(["Add Applicant", "Update Applicant"] + (["Delete Applicant"] if st.session_state.user_role == "Master" else []))
+        tabs = st.tabs(["Add Applicant", "Update Applicant"] + (["Delete Applicant", "Bulk Import"] if st.session_state.user_role == "Master" else []))
 
         # Create Operation
         with tabs[0]:
@@ -176,10 +616,9 @@ def main():
                     elif not bdm_name:
                         st.error("Please assign a BDM.")
                     else:
-                        id_number = generate_unique_id(applicants_df)
                         new_data = {
                             'Name': name, 'Contact_Number': contact_number, 'Address': address,
-                            'ID_Number': id_number, 'Email_Address': email_address,
+                            'Email_Address': email_address,
                             'Country_of_Interest': country_of_interest, 'Type_of_Visa': type_of_visa,
                             'Education_Level': education_level, 'Diploma': diploma,
                             'Work_Experience': work_experience, 'Current_Job': current_job,
@@ -187,12 +626,14 @@ def main():
                             'Signature': signature, 'Date': date, 'BDM_Name': bdm_name,
                             'Entered_By': st.session_state.username
                         }
-                        applicants_df = create_applicant(applicants_df, new_data)
-                        if save_data(applicants_df, APPLICANTS_FILE):
+                        try:
+                            id_number = generate_unique_id()
+                            new_data['ID_Number'] = id_number
+                            applicants_df = create_applicant(applicants_df, new_data)
                             st.success(f"Applicant added successfully with ID: {id_number} by {st.session_state.username}!")
                             st.session_state.add_form_submitted = True
-                        else:
-                            st.error("Failed to add applicant!")
+                        except StorageError as e:
+                            st.error(f"Failed to add applicant: {str(e)}")
             # Reset button outside the form
             if st.session_state.add_form_submitted and st.button("Reset Add Form"):
                 st.session_state.add_form_submitted = False
@@ -204,12 +645,12 @@ def main():
             if applicants_df.empty:
                 st.info("No applicants available to update.")
             else:
-                applicant_names = applicants_df['Name'].tolist()
-                selected_applicant = st.selectbox("Select Applicant to Update", applicant_names)
-                applicant_index = applicant_names.index(selected_applicant)
-                current_data = applicants_df.iloc[applicant_index]
+                applicant_index = select_applicant("Select Applicant to Update", "update", applicants_df)
+                current_data = applicants_df.loc[applicant_index] if applicant_index is not None else None
 
-                if st.session_state.user_role != "Master" and current_data['BDM_Name'] != st.session_state.username:
+                if current_data is None:
+                    st.info("No applicants match your search.")
+                elif st.session_state.user_role != "Master" and current_data['BDM_Name'] != st.session_state.username:
                     st.error("You can only update your assigned applicants.")
                 else:
                     with st.form("update_applicant_form"):
@@ -259,12 +700,12 @@ def main():
                                     'Signature': signature, 'Date': date, 'BDM_Name': bdm_name,
                                     'Entered_By': st.session_state.username
                                 }
-                                applicants_df = update_applicant(applicants_df, applicant_index, updated_data)
-                                if save_data(applicants_df, APPLICANTS_FILE):
+                                try:
+                                    applicants_df = update_applicant(applicants_df, applicant_index, updated_data)
                                     st.success(f"Applicant updated successfully by {st.session_state.username}!")
                                     st.session_state.update_form_submitted = True
-                                else:
-                                    st.error("Failed to update applicant!")
+                                except StorageError as e:
+                                    st.error(f"Failed to update applicant: {str(e)}")
                     # Reset button outside the form
                     if st.session_state.update_form_submitted and st.button("Reset Update Form"):
                         st.session_state.update_form_submitted = False
@@ -277,21 +718,58 @@ def main():
                 if applicants_df.empty:
                     st.info("No applicants available to delete.")
                 else:
-                    selected_applicant = st.selectbox("Select Applicant to Delete", applicants_df['Name'].tolist())
+                    applicant_index = select_applicant("Select Applicant to Delete", "delete", applicants_df)
+                    if applicant_index is None:
+                        st.info("No applicants match your search.")
                     with st.form("delete_applicant_form"):
                         submit_button = st.form_submit_button("Delete Applicant")
-                        if submit_button and not st.session_state.delete_form_submitted:
-                            applicants_df = delete_applicant(applicants_df, selected_applicant)
-                            if save_data(applicants_df, APPLICANTS_FILE):
-                                st.success(f"Applicant {selected_applicant} deleted successfully!")
+                        if submit_button and applicant_index is not None and not st.session_state.delete_form_submitted:
+                            selected_applicant = applicants_df.at[applicant_index, 'Name']
+                            id_number = applicants_df.at[applicant_index, 'ID_Number']
+                            try:
+                                applicants_df = delete_applicant(applicants_df, id_number)
+                                st.success(f"Applicant {selected_applicant} ({id_number}) deleted successfully!")
                                 st.session_state.delete_form_submitted = True
-                            else:
-                                st.error("Failed to delete applicant!")
+                            except StorageError as e:
+                                st.error(f"Failed to delete applicant: {str(e)}")
                     # Reset button outside the form
                     if st.session_state.delete_form_submitted and st.button("Reset Delete Form"):
                         st.session_state.delete_form_submitted = False
                         st.experimental_rerun()
 
+        # Bulk Import (Only for Master)
+        if st.session_state.user_role == "Master" and len(tabs) > 3:
+            with tabs[3]:
+                st.write("Import applicants from an Excel or CSV file")
+                with st.form("bulk_import_form"):
+                    uploaded_file = st.file_uploader("File", type=["xlsx", "csv"])
+                    st.caption("Used for rows that leave these columns empty.")
+                    default_bdm = st.selectbox("BDM Name", users_df['Username'].tolist()) if not users_df.empty else ""
+                    default_visa = st.selectbox("Type of Visa", VISA_TYPES)
+                    default_diploma = st.selectbox("Diploma", DIPLOMA_OPTIONS)
+                    submit_button = st.form_submit_button("Import")
+                if submit_button:
+                    if uploaded_file is None:
+                        st.error("Please choose a file to import.")
+                    else:
+                        progress_bar = st.progress(0.0)
+
+                        def show_progress(rows_read, total):
+                            progress_bar.progress(min(rows_read / total, 1.0) if total else 0.0,
+                                                  text=f"Read {rows_read} rows")
+                        defaults = dict(default_values(default_bdm, st.session_state.username),
+                                        Type_of_Visa=default_visa, Diploma=default_diploma)
+                        try:
+                            applicants_df, report = bulk_import_applicants(applicants_df, uploaded_file, defaults,
+                                                                           show_progress)
+                            progress_bar.progress(1.0, text=f"Read {report.rows_read} rows")
+                            st.success(f"Imported {report.imported} of {report.rows_read} rows "
+                                       f"({report.duplicates} duplicates, {report.invalid} invalid).")
+                            if report.rejected:
+                                st.dataframe(pd.DataFrame(report.rejected), hide_index=True)
+                        except Exception as e:
+                            st.error(f"Failed to import applicants: {str(e)}")
+
     # User Management (for Master users)
     elif choice == "User Management" and st.session_state.user_role == "Master":
         st.subheader("User Management")
@@ -305,8 +783,7 @@ def main():
                 elif not new_username or not new_password:
                     st.error("Username and password cannot be empty!")
                 else:
-                    new_user = pd.DataFrame({'Username': [new_username], 'Password': [new_password], 'Role': [role]})
-                    if save_data(pd.concat([users_df, new_user], ignore_index=True), USERS_FILE):
+                    if add_user(new_username, new_password, role):
                         st.success(f"User {new_username} added successfully!")
                         st.session_state.user_form_submitted = True
                     else:
@@ -325,10 +802,12 @@ def main():
                 col3.write("****")
                 if row['Username'] != st.session_state.username:
                     if col4.button("Delete", key=f"del_{i}") and not st.session_state.user_form_submitted:
-                        applicants_df.loc[applicants_df['BDM_Name'] == row['Username'], 'BDM_Name'] = ''
-                        save_data(applicants_df, APPLICANTS_FILE)
-                        users_df = users_df[users_df['Username'] != row['Username']]
-                        if save_data(users_df, USERS_FILE):
+                        try:
+                            applicants_df = reassign_applicants(applicants_df, row['Username'], '')
+                        except StorageError as e:
+                            st.error(f"Failed to unassign applicants: {str(e)}")
+                            continue
+                        if delete_user(row['Username']):
                             st.success(f"User {row['Username']} deleted!")
                             st.session_state.user_form_submitted = True
                         else:
@@ -339,6 +818,39 @@ def main():
                 st.experimental_rerun()
         else:
             st.write("No users found.")
+
+    # Diagnostics (for Master users)
+    # Rolling timings of the instrumented hooks across every session on this
+    # server, this session's previous rerun broken down by hook, and exports.
+    elif choice == "Diagnostics" and st.session_state.user_role == "Master":
+        st.subheader("Diagnostics")
+        metrics.enabled = st.toggle("Collect timings", value=metrics.enabled)
+        snapshot = metrics.snapshot()
+        st.write(f"Last {snapshot['window_seconds'] // 60} minutes, all sessions (milliseconds):")
+        if snapshot['histograms']:
+            summary = pd.DataFrame.from_dict(snapshot['histograms'], orient='index').drop(columns=['sum_s'])
+            st.dataframe(summary.round(2), column_config={'count': st.column_config.NumberColumn(format="%d")})
+            name = st.selectbox("Histogram", list(snapshot['buckets']))
+            counts = snapshot['buckets'][name]
+            histogram = pd.DataFrame({'count': counts},
+                                     index=[f"<= {bound * 1000:g} ms" for bound in BUCKETS] + [f"> {BUCKETS[-1]:g} s"])
+            st.dataframe(histogram, column_config={'count': st.column_config.ProgressColumn(
+                "count", format="%d", min_value=0, max_value=max(max(counts), 1))})
+        else:
+            st.info("No timings recorded yet.")
+        last_rerun = st.session_state.get('last_rerun_timings')
+        if last_rerun:
+            st.write("Previous rerun of this session (milliseconds):")
+            st.dataframe((pd.Series(last_rerun, name='ms') * 1000).round(2).sort_values(ascending=False))
+        if snapshot['counters']:
+            st.write("Counters:")
+            st.dataframe(pd.Series(snapshot['counters'], name='count'))
+        col1, col2, col3 = st.columns(3)
+        col1.download_button("Export JSON", metrics.to_json(), "onms_metrics.json", "application/json")
+        col2.download_button("Export Prometheus", metrics.to_prometheus(), "onms_metrics.prom", "text/plain")
+        if col3.button("Reset"):
+            metrics.reset()
+            st.success("Timings reset.")
             
 if __name__ == "__main__":
     if not os.path.exists(APPLICANTS_FILE):
@@ -346,17 +858,18 @@ if __name__ == "__main__":
             ['John Doe', '+1234567890', '123 Main St', 'ONMS0001', 'john.doe@example.com', 
              'Canada', 'Student', 'Bachelor', 'Yes', '2 years', 'Software Engineer', 
              'USA, UK', 'No', 'John Doe', datetime.date.today(), 'admin', 'admin']
-        ], columns=['Name', 'Contact_Number', 'Address', 'ID_Number', 'Email_Address', 
-                    'Country_of_Interest', 'Type_of_Visa', 'Education_Level', 'Diploma', 
-                    'Work_Experience', 'Current_Job', 'Travel_History', 'Any_Refusal', 
-                    'Signature', 'Date', 'BDM_Name', 'Entered_By'])
-        save_data(initial_applicants, APPLICANTS_FILE)
+        ], columns=APPLICANT_COLUMNS)
+        save_data(initial_applicants, APPLICANTS_FILE, wait=True)  # The stores read it on open
 
     if not os.path.exists(USERS_FILE):
         initial_users = pd.DataFrame([
-            {'Username': 'admin', 'Password': 'admin123', 'Role': 'Master'},
-            {'Username': 'john', 'Password': 'pass123', 'Role': 'Normal'}
+            {'Username': 'admin', 'Password': hash_password('admin123'), 'Role': 'Master'},
+            {'Username': 'john', 'Password': hash_password('pass123'), 'Role': 'Normal'}
         ])
-        save_data(initial_users, USERS_FILE)
+        save_data(initial_users, USERS_FILE, wait=True)
 
-    main()
+    metrics.begin_rerun()
+    try:
+        main()
+    finally:
+        st.session_state.last_rerun_timings = metrics.end_rerun()
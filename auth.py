@@ -0,0 +1,138 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+import pandas as pd
+
+# Passwords are stored as "scrypt$<n>$<r>$<p>$<salt>$<hash>" (base64 salt and
+# hash), so the cost can be changed later: hashes made with other parameters
+# are redone the next time their owner logs in. n=2**14, r=8 takes about 55 ms
+# and 16 MB per hash on one core (see benchmark() below); ONMS_SCRYPT_N tunes it.
+SCRYPT_N = int(os.environ.get("ONMS_SCRYPT_N", 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_PREFIX = 'scrypt$'
+
+# scrypt releases the GIL, but a burst of logins at shift start would still
+# take every core and n*r*128 bytes each; capping the hashes in flight keeps
+# the rest of the server responsive while the burst queues.
+_hash_slots = threading.BoundedSemaphore(2)
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    with _hash_slots:
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=2 * 128 * n * r * p, dklen=32)
+
+
+def hash_password(password: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return '$'.join(['scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+                     base64.b64encode(salt).decode('ascii'), base64.b64encode(digest).decode('ascii')])
+
+
+def is_hashed(stored: str) -> bool:
+    return str(stored).startswith(HASH_PREFIX)
+
+
+def verify_password(password: str, stored: str) -> bool:
+    if not stored:
+        return False  # A blank password cell never logs in
+    if not is_hashed(stored):
+        # Rows written before passwords were hashed; see migrate_passwords.
+        return hmac.compare_digest(str(password).encode('utf-8'), str(stored).encode('utf-8'))
+    try:
+        _, n, r, p, salt, digest = stored.split('$')
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: str) -> bool:
+    if not is_hashed(stored):
+        return True
+    return stored.split('$')[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def plaintext_passwords(users_df: pd.DataFrame) -> pd.Series:
+    # Rows still holding a plaintext password; blank cells are not passwords.
+    stored = users_df['Password'].fillna('').astype(str)
+    return (stored != '') & ~stored.map(is_hashed)
+
+
+def migrate_passwords(users_df: pd.DataFrame) -> pd.DataFrame:
+    # Hash every plaintext password in place; already hashed and blank rows
+    # are untouched.
+    users_df = users_df.copy()
+    plaintext = plaintext_passwords(users_df)
+    users_df['Password'] = users_df['Password'].astype(object)
+    users_df.loc[plaintext, 'Password'] = [hash_password(str(p)) for p in users_df.loc[plaintext, 'Password']]
+    return users_df
+
+
+class Credential(NamedTuple):
+    password: str  # The stored hash (or legacy plaintext)
+    role: str
+
+
+# Username -> Credential, built once from the users workbook and reused until
+# the file changes (checked by its mtime and size, one stat per login) or
+# invalidate() is called after a user is added or deleted, so a login is a
+# dict lookup plus one hash instead of a workbook read and a column scan.
+class CredentialStore:
+    def __init__(self, signature: Callable[[], Optional[tuple]], loader: Callable[[], pd.DataFrame]):
+        self._signature = signature
+        self._loader = loader
+        self._credentials: Dict[str, Credential] = {}
+        self._version = None
+        self._lock = threading.Lock()
+        # Unknown usernames are checked against this so they take as long as known ones.
+        self._dummy = hash_password(base64.b64encode(os.urandom(SALT_BYTES)).decode('ascii'))
+
+    def _current(self) -> Dict[str, Credential]:
+        signature = self._signature()
+        with self._lock:
+            if self._version is None or signature != self._version:
+                users_df = self._loader()
+                self._credentials = {str(u): Credential(str(p), str(r)) for u, p, r in
+                                     zip(users_df['Username'], users_df['Password'].fillna(''), users_df['Role'])}
+                self._version = signature
+            return self._credentials
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+
+    def lookup(self, username: str) -> Optional[Credential]:
+        return self._current().get(username)
+
+    def authenticate(self, username: str, password: str) -> Optional[Credential]:
+        credential = self.lookup(username)
+        if credential is None:
+            verify_password(password, self._dummy)
+            return None
+        return credential if verify_password(password, credential.password) else None
+
+
+def benchmark(rounds: int = 5) -> None:
+    # python auth.py: time one hash at a few costs, to pick ONMS_SCRYPT_N.
+    for n in (2 ** 13, 2 ** 14, 2 ** 15, 2 ** 16):
+        salt = os.urandom(SALT_BYTES)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            _scrypt('benchmark-password', salt, n, SCRYPT_R, SCRYPT_P)
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"n=2**{n.bit_length() - 1}: {elapsed * 1000:.1f} ms per hash, "
+              f"{128 * n * SCRYPT_R // 2 ** 20} MB, {1 / elapsed:.0f} logins/s per core")
+
+
+if __name__ == "__main__":
+    benchmark()
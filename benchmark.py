@@ -0,0 +1,250 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from fixtures import BENCH_PASSWORD_SUFFIX, FIXTURE_SIZES, FIXTURES_DIR, write_fixture
+
+# Benchmarks for the app's data paths, run against app.py outside Streamlit.
+# Each (rows, backend) case runs in its own process, in a scratch copy of the
+# fixture workbooks, so caches, store singletons and peak memory never leak
+# between cases. Every operation is timed for at least --min-runs runs and
+# --seconds of wall time (capped at --max-runs), then run once more under
+# tracemalloc for its peak allocation. Results are JSON, tagged with the
+# commit, so two runs can be compared with "python benchmark.py compare".
+PERCENTILES = [50, 90, 95, 99]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    position = (len(sorted_values) - 1) * pct / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+def _summarize(samples: List[float], peak_bytes: int) -> dict:
+    ordered = sorted(samples)
+    summary = {'runs': len(samples), 'mean_ms': sum(samples) / len(samples) * 1000,
+               'min_ms': ordered[0] * 1000, 'max_ms': ordered[-1] * 1000}
+    for pct in PERCENTILES:
+        summary[f'p{pct}_ms'] = _percentile(ordered, pct) * 1000
+    summary['peak_alloc_mb'] = peak_bytes / 2 ** 20
+    return summary
+
+
+def _measure(operation: Callable[[], object], setup: Optional[Callable[[], None]], min_runs: int,
+             max_runs: int, seconds: float) -> dict:
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - started < seconds):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    operation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return _summarize(samples, peak)
+
+
+def _max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10  # bytes on macOS, KiB elsewhere
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(rows: int, backend: str, fixtures: str, min_runs: int, max_runs: int, seconds: float,
+             only: Optional[List[str]]) -> dict:
+    source = os.path.abspath(write_fixture(rows, fixtures))
+    workdir = tempfile.mkdtemp(prefix=f'onms_bench_{rows}_')
+    for name in ('onms_applicants.xlsx', 'onms_users.xlsx'):
+        shutil.copy(os.path.join(source, name), workdir)
+    os.environ['ONMS_STORAGE'] = backend
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    try:
+        import streamlit.logger
+        streamlit.logger.set_log_level('error')  # Quiet the bare-mode warnings on every st call
+        import app  # Imported here, after the working directory and backend are set
+
+        rng = random.Random(0)
+        setup_started = time.perf_counter()
+        store = app.get_applicant_store()
+        store.refresh_snapshot()
+        df = app.load_applicants()
+        users = app.load_users()
+        setup_seconds = time.perf_counter() - setup_started
+        bdms = [u for u, r in zip(users['Username'], users['Role']) if r == 'Normal']
+        state = {'df': df, 'created': []}
+        template = df.iloc[0].to_dict()
+
+        def load_cold():
+            app.get_table_cache().invalidate('applicants')
+            app.load_applicants()
+
+        def create():
+            row = dict(template, Name=f"Bench Applicant {len(state['created'])}")
+            row['ID_Number'] = app.generate_unique_id()
+            state['df'] = app.create_applicant(state['df'], row)
+            state['created'].append(row['ID_Number'])
+
+        def update():
+            label = state['df'].index[rng.randrange(len(state['df']))]
+            state['df'] = app.update_applicant(state['df'], label, {'Work_Experience': f"{rng.randrange(20)} years"})
+
+        def delete():
+            id_number = state['created'].pop() if state['created'] else state['df']['ID_Number'].iloc[-1]
+            state['df'] = app.delete_applicant(state['df'], id_number)
+
+        def login():
+            username = rng.choice(bdms)
+            assert app.authenticate(username, username + BENCH_PASSWORD_SUFFIX) == 'Normal'
+
+        def cascade_setup():
+            # The next BDM to delete: the benchmark consumes them from the end.
+            state['victim'] = bdms.pop()
+
+        def cascade():
+            state['df'] = app.reassign_applicants(state['df'], state['victim'], '')
+            app.delete_user(state['victim'])
+
+        applicants_copy = os.path.join(workdir, 'bench_save.xlsx')
+        operations: Dict[str, tuple] = {
+            'load_applicants (warm)': (app.load_applicants, None, max_runs),
+            'load_applicants (cold)': (load_cold, None, max_runs),
+            'read_applicants': (lambda: app.read_applicants(state['df'], rng.choice(bdms)), None, max_runs),
+            'generate_unique_id': (app.generate_unique_id, None, max_runs),
+            'create_applicant': (create, None, max_runs),
+            'update_applicant': (update, None, max_runs),
+            'delete_applicant': (delete, None, max_runs),
+            'authenticate': (login, None, max_runs),
+            'save_data (users)': (lambda: app.save_data(app.load_users(), app.USERS_FILE), None, max_runs),
+            'save_data (applicants)': (lambda: app.save_data(state['df'], applicants_copy), None, max_runs),
+            # Returns once the change is queued; the written variant also waits for the workbook rewrite.
+            'save_data (users, written)': (lambda: app.save_data(app.load_users(), app.USERS_FILE, wait=True),
+                                           None, max_runs),
+            # Each run deletes one fixture BDM, so keep some for read_applicants/authenticate.
+            'user deletion cascade': (cascade, cascade_setup, max(1, len(bdms) // 2 - 1)),
+        }
+        results = {}
+        for name, (operation, setup, cap) in operations.items():
+            if only and name not in only:
+                continue
+            results[name] = _measure(operation, setup, min(min_runs, cap), min(max_runs, cap), seconds)
+            print(f"  {name:<26} p50 {results[name]['p50_ms']:10.2f} ms  p95 {results[name]['p95_ms']:10.2f} ms  "
+                  f"peak {results[name]['peak_alloc_mb']:8.1f} MB", file=sys.stderr)
+        app.get_writer().close()
+        store.close()
+        return {'rows': rows, 'backend': backend, 'setup_seconds': setup_seconds, 'max_rss_mb': _max_rss_mb(),
+                'operations': results}
+    finally:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args) -> dict:
+    # One subprocess per case; each prints its result as JSON on stdout.
+    report = {'commit': _commit(), 'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(), 'platform': platform.platform(), 'cases': []}
+    for rows in args.rows:
+        for backend in args.backend:
+            print(f"{rows} rows, {backend}", file=sys.stderr)
+            command = [sys.executable, os.path.abspath(__file__), 'case', '--rows', str(rows), '--backend', backend,
+                       '--fixtures', os.path.abspath(args.fixtures), '--min-runs', str(args.min_runs),
+                       '--max-runs', str(args.max_runs), '--seconds', str(args.seconds)]
+            if args.only:
+                command += ['--only'] + args.only
+            output = subprocess.run(command, stdout=subprocess.PIPE, check=True, text=True).stdout
+            report['cases'].append(json.loads(output))
+    return report
+
+
+def compare(baseline: dict, current: dict, metric: str = 'p50_ms') -> None:
+    # Ratio current/baseline per case and operation; above 1 is slower.
+    print(f"{baseline.get('commit')} -> {current.get('commit')} ({metric})")
+    cases = {(c['rows'], c['backend']): c for c in baseline['cases']}
+    for case in current['cases']:
+        old = cases.get((case['rows'], case['backend']))
+        if old is None:
+            continue
+        print(f"{case['rows']} rows, {case['backend']}")
+        for name, result in case['operations'].items():
+            before = old['operations'].get(name)
+            if before is None or not before[metric]:
+                continue
+            print(f"  {name:<26} {before[metric]:10.2f} -> {result[metric]:10.2f}  x{result[metric] / before[metric]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ONMS data paths against synthetic fixtures.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('run', 'case'):
+        command = commands.add_parser(name)
+        command.add_argument('--fixtures', default=FIXTURES_DIR)
+        command.add_argument('--min-runs', type=int, default=5)
+        command.add_argument('--max-runs', type=int, default=200)
+        command.add_argument('--seconds', type=float, default=2.0, help="Minimum wall time per operation")
+        command.add_argument('--only', nargs='+', help="Operation names to run")
+        if name == 'run':
+            command.add_argument('--rows', type=int, nargs='+', default=FIXTURE_SIZES)
+            command.add_argument('--backend', nargs='+', default=['sqlite'], choices=['sqlite', 'excel'])
+            command.add_argument('--output', help="Write the JSON report here instead of stdout")
+        else:
+            command.add_argument('--rows', type=int, required=True)
+            command.add_argument('--backend', default='sqlite', choices=['sqlite', 'excel'])
+    command = commands.add_parser('compare')
+    command.add_argument('baseline')
+    command.add_argument('current')
+    command.add_argument('--metric', default='p50_ms')
+    args = parser.parse_args()
+
+    if args.command == 'case':
+        result = run_case(args.rows, args.backend, args.fixtures, args.min_runs, args.max_runs, args.seconds, args.only)
+        print(json.dumps(result))
+    elif args.command == 'run':
+        report = json.dumps(run(args), indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(report + '\n')
+        else:
+            print(report)
+    else:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, encoding='utf-8') as f:
+            current = json.load(f)
+        compare(baseline, current, args.metric)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from auth import hash_password
+from storage import APPLICANT_COLUMNS, DIPLOMA_OPTIONS, VISA_TYPES, atomic_write_excel, format_applicant_id
+
+# Synthetic applicant books for benchmarks. Every column is drawn from
+# plausible values with the skew a real book has (a few popular countries and
+# visa types, uneven BDM workloads), and emails and phone numbers are unique so
+# the search and dedupe paths see realistic cardinalities. Generation is
+# seeded, so a given size always produces the same data.
+FIXTURE_SIZES = [1000, 10000, 100000, 500000]
+FIXTURES_DIR = "bench_fixtures"
+BENCH_PASSWORD_SUFFIX = "-bench"  # Every fixture user's password is username + suffix
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Mohammed', 'Fatima', 'Wei', 'Mei', 'Olusegun', 'Chiamaka', 'Juan',
+               'Maria', 'Oliver', 'Amelia', 'Arjun', 'Ananya', 'Hassan', 'Aisha', 'Nguyen', 'Linh',
+               'Kwame', 'Ama', 'Rahul', 'Sneha', 'Omar', 'Layla', 'Thomas', 'Sophie', 'Ivan', 'Olga']
+LAST_NAMES = ['Sharma', 'Patel', 'Khan', 'Ali', 'Zhang', 'Li', 'Adeyemi', 'Okafor', 'Garcia', 'Lopez',
+              'Smith', 'Jones', 'Singh', 'Gupta', 'Hussain', 'Rahman', 'Tran', 'Pham', 'Mensah',
+              'Owusu', 'Das', 'Reddy', 'Haddad', 'Nasser', 'Brown', 'Martin', 'Petrov', 'Ivanova']
+CITIES = ['Mumbai', 'Delhi', 'Lagos', 'Accra', 'Dhaka', 'Karachi', 'Manila', 'Hanoi', 'Nairobi',
+          'Cairo', 'Kathmandu', 'Colombo', 'Bogota', 'Lima', 'Kyiv', 'Almaty']
+COUNTRIES = ['Canada', 'Australia', 'United Kingdom', 'USA', 'New Zealand', 'Germany', 'Ireland',
+             'France', 'Netherlands', 'Sweden', 'Japan', 'Singapore']
+COUNTRY_WEIGHTS = [0.28, 0.2, 0.16, 0.12, 0.06, 0.05, 0.04, 0.03, 0.02, 0.02, 0.01, 0.01]
+VISA_WEIGHTS = [0.45, 0.25, 0.12, 0.1, 0.08]
+EDUCATION_LEVELS = ['High School', 'Diploma', 'Bachelor', 'Master', 'PhD']
+JOBS = ['Software Engineer', 'Nurse', 'Accountant', 'Teacher', 'Student', 'Electrician', 'Chef',
+        'Sales Executive', 'Civil Engineer', 'Data Analyst', 'Pharmacist', 'Unemployed']
+REFUSALS = ['No', 'No', 'No', 'No', 'Yes - Visit visa 2019', 'Yes - Student visa 2021']
+
+
+def bdm_names(rows: int) -> list:
+    return [f"bdm{i:03d}" for i in range(max(5, min(200, rows // 2000)))]
+
+
+def generate_users(rows: int) -> pd.DataFrame:
+    users = [('admin', 'Master'), ('manager', 'Master')] + [(name, 'Normal') for name in bdm_names(rows)]
+    return pd.DataFrame({'Username': [u for u, _ in users],
+                         'Password': [hash_password(u + BENCH_PASSWORD_SUFFIX) for u, _ in users],
+                         'Role': [r for _, r in users]})
+
+
+def generate_applicants(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    pick = lambda values, p=None: np.asarray(values, dtype=object)[rng.choice(len(values), rows, p=p)]
+    first, last = pick(FIRST_NAMES), pick(LAST_NAMES)
+    serial = np.arange(1, rows + 1)
+    bdms = bdm_names(rows)
+    bdm_weights = rng.pareto(2.0, len(bdms)) + 1  # A few BDMs carry most of the book
+    today = datetime.date.today()
+    days_ago = rng.integers(0, 730, rows)
+    df = pd.DataFrame({
+        'Name': first + ' ' + last,
+        'Contact_Number': ['+91 ' + str(9000000000 + n * 7919 % 999999999) for n in serial],
+        'Address': [f"{n % 400 + 1} Main Road, {city}" for n, city in zip(serial, pick(CITIES))],
+        'ID_Number': [format_applicant_id(n) for n in serial],
+        'Email_Address': [f"{f.lower()}.{l.lower()}{n}@example.com" for f, l, n in zip(first, last, serial)],
+        'Country_of_Interest': pick(COUNTRIES, COUNTRY_WEIGHTS),
+        'Type_of_Visa': pick(VISA_TYPES, VISA_WEIGHTS),
+        'Education_Level': pick(EDUCATION_LEVELS),
+        'Diploma': pick(DIPLOMA_OPTIONS),
+        'Work_Experience': [f"{y} years" for y in rng.integers(0, 15, rows)],
+        'Current_Job': pick(JOBS),
+        'Travel_History': pick(['None', 'UAE', 'UK, USA', 'Singapore', 'Thailand, Malaysia']),
+        'Any_Refusal': pick(REFUSALS),
+        'Signature': first + ' ' + last,
+        'Date': [(today - datetime.timedelta(days=int(d))).isoformat() for d in days_ago],
+        'BDM_Name': pick(bdms, bdm_weights / bdm_weights.sum()),
+    })
+    df['Entered_By'] = np.where(rng.random(rows) < 0.8, df['BDM_Name'], 'admin')
+    return df[APPLICANT_COLUMNS]
+
+
+def fixture_dir(rows: int, base: str = FIXTURES_DIR) -> str:
+    return os.path.join(base, str(rows))
+
+
+def write_fixture(rows: int, base: str = FIXTURES_DIR, seed: int = 0) -> str:
+    # Writes <base>/<rows>/onms_applicants.xlsx and onms_users.xlsx, once.
+    directory = fixture_dir(rows, base)
+    applicants_path = os.path.join(directory, 'onms_applicants.xlsx')
+    users_path = os.path.join(directory, 'onms_users.xlsx')
+    os.makedirs(directory, exist_ok=True)
+    if not os.path.exists(users_path):
+        atomic_write_excel(generate_users(rows), users_path)
+    if not os.path.exists(applicants_path):
+        atomic_write_excel(generate_applicants(rows, seed), applicants_path)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic ONMS workbooks for benchmarking.")
+    parser.add_argument('--rows', type=int, nargs='+', default=FIXTURE_SIZES)
+    parser.add_argument('--out', default=FIXTURES_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for rows in args.rows:
+        print(f"{rows} rows -> {write_fixture(rows, args.out, args.seed)}")
+
+
+if __name__ == "__main__":
+    main()
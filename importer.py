@@ -0,0 +1,205 @@
+import datetime
+import os
+import re
+import tempfile
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from storage import APPLICANT_COLUMNS, DIPLOMA_OPTIONS, VISA_TYPES, ApplicantStore, to_cell
+
+CHUNK_SIZE = 5000
+MAX_REJECTED_SHOWN = 500
+EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+
+# Source headers are compared after lowercasing and dropping everything but
+# letters and digits, so "Mobile Phone1", "mobile_phone1" and "MOBILE PHONE 1"
+# all match. Applicant columns map to themselves, so an exported workbook
+# imports back unchanged; the rest covers the lead dumps we receive
+# (leads.xlsx). Later entries only fill cells the earlier ones left empty.
+COLUMN_ALIASES = [(re.sub(r'[^a-z0-9]', '', col.lower()), col) for col in APPLICANT_COLUMNS] + [
+    ('fullname', 'Name'),
+    ('email', 'Email_Address'),
+    ('mobilephone1', 'Contact_Number'),
+    ('mobilephone', 'Contact_Number'),
+    ('phone', 'Contact_Number'),
+    ('mobilephone2', 'Contact_Number'),
+    ('companyphone', 'Contact_Number'),
+    ('companyaddress', 'Address'),
+    ('country', 'Country_of_Interest'),
+    ('title', 'Current_Job'),
+    ('assigneduser', 'BDM_Name'),
+]
+
+
+def _normalize_header(header) -> str:
+    return re.sub(r'[^a-z0-9]', '', str(header).lower())
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows_read = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.rejected = []  # Up to MAX_REJECTED_SHOWN {'Row', 'Name', 'Reason'} dicts
+
+
+# Chunked readers: at most chunk_size source rows are held at a time. Cells
+# come back as text, with Excel numbers and dates rendered by to_cell.
+def read_xlsx_chunks(source, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[pd.DataFrame, Optional[int]]]:
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = sheet.max_row - 1 if sheet.max_row else None
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(h) if h is not None else f'column_{i}' for i, h in enumerate(header)]
+        padding = ('',) * len(columns)
+        batch = []
+        for row in rows:
+            batch.append([to_cell(value) for value in (tuple(row) + padding)[:len(columns)]])
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=columns), total
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns), total
+    finally:
+        workbook.close()
+
+
+def read_csv_chunks(source, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[pd.DataFrame, Optional[int]]]:
+    for chunk in pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                             encoding='utf-8-sig', encoding_errors='replace'):
+        yield chunk, None
+
+
+# Schema mapping and validation work on whole chunks at a time.
+def map_columns(chunk: pd.DataFrame) -> pd.DataFrame:
+    headers = {}
+    for column in chunk.columns:
+        headers.setdefault(_normalize_header(column), column)
+    mapped = pd.DataFrame({col: '' for col in APPLICANT_COLUMNS}, index=chunk.index)
+    for alias, col in COLUMN_ALIASES:
+        if alias in headers:
+            values = chunk[headers[alias]].fillna('').astype(str).str.strip()
+            mapped[col] = mapped[col].mask(mapped[col] == '', values)
+    if 'firstname' in headers or 'lastname' in headers:
+        first = chunk[headers['firstname']].fillna('').astype(str) if 'firstname' in headers else ''
+        last = chunk[headers['lastname']].fillna('').astype(str) if 'lastname' in headers else ''
+        full_name = (first + ' ' + last).str.strip().str.replace(r'\s+', ' ', regex=True)
+        mapped['Name'] = mapped['Name'].mask(mapped['Name'] == '', full_name)
+    return mapped
+
+
+def validate(df: pd.DataFrame, known_bdms: set) -> pd.Series:
+    # Reason each row is rejected, '' for rows that are fine.
+    dates = pd.to_datetime(df['Date'], errors='coerce')
+    checks = [
+        (df['Name'] == '', 'Name is required'),
+        ((df['Email_Address'] != '') & ~df['Email_Address'].str.match(EMAIL_PATTERN), 'Invalid email address'),
+        ((df['Type_of_Visa'] != '') & ~df['Type_of_Visa'].isin(VISA_TYPES), 'Unknown visa type'),
+        ((df['Diploma'] != '') & ~df['Diploma'].isin(DIPLOMA_OPTIONS), 'Diploma must be Yes or No'),
+        ((df['Date'] != '') & dates.isna(), 'Invalid date'),
+        ((df['BDM_Name'] != '') & ~df['BDM_Name'].isin(known_bdms), 'Unknown BDM'),
+    ]
+    reasons = pd.Series('', index=df.index)
+    for failed, reason in reversed(checks):  # The first failing check wins
+        reasons = reasons.mask(failed, reason)
+    return reasons
+
+
+# Duplicate detection against existing records and earlier rows of the same
+# file. Emails (lowercased) and phone numbers (last ten digits) are kept as
+# 64-bit hashes, which keeps the index small for large books.
+def _email_keys(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().str.lower()
+
+
+def _phone_keys(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.replace(r'\D', '', regex=True).str[-10:]
+
+
+def _hashes(keys: pd.Series) -> pd.Series:
+    return pd.Series(pd.util.hash_pandas_object(keys, index=False).to_numpy(), index=keys.index)
+
+
+class DedupeIndex:
+    def __init__(self, existing: pd.DataFrame):
+        self.emails = set(self._present(_email_keys(existing['Email_Address'])))
+        self.phones = set(self._present(_phone_keys(existing['Contact_Number'])))
+
+    @staticmethod
+    def _present(keys: pd.Series) -> pd.Series:
+        return _hashes(keys[keys != ''])
+
+    def seen(self, df: pd.DataFrame) -> pd.Series:
+        # Flags rows whose email or phone is already known, then remembers the rest.
+        emails, phones = _email_keys(df['Email_Address']), _phone_keys(df['Contact_Number'])
+        email_hashes, phone_hashes = _hashes(emails), _hashes(phones)
+        has_email, has_phone = emails != '', phones != ''
+        duplicate = ((has_email & (email_hashes.isin(self.emails) | email_hashes.duplicated()))
+                     | (has_phone & (phone_hashes.isin(self.phones) | phone_hashes.duplicated())))
+        self.emails.update(email_hashes[has_email & ~duplicate])
+        self.phones.update(phone_hashes[has_phone & ~duplicate])
+        return duplicate
+
+
+# Accepted rows are spooled to a temporary CSV while the file is read, so
+# memory stays bounded by the chunk size, then get their IDs from a single
+# reservation and go to the store in one insert_many call.
+def import_applicants(source, filename: str, store: ApplicantStore, existing: pd.DataFrame, defaults: dict,
+                      known_bdms: set, progress: Optional[Callable[[int, Optional[int]], None]] = None,
+                      chunk_size: int = CHUNK_SIZE) -> ImportReport:
+    report = ImportReport()
+    reader = read_csv_chunks if filename.lower().endswith('.csv') else read_xlsx_chunks
+    dedupe = DedupeIndex(existing)
+    fd, spool_path = tempfile.mkstemp(prefix='onms_import_', suffix='.csv')
+    os.close(fd)
+    try:
+        for chunk, total in reader(source, chunk_size):
+            first_row = report.rows_read + 2  # Spreadsheet row numbers, after the header
+            report.rows_read += len(chunk)
+            df = map_columns(chunk)
+            for col, value in defaults.items():
+                df[col] = df[col].mask(df[col] == '', value)
+            reasons = validate(df, known_bdms)
+            valid = reasons == ''
+            duplicate = pd.Series(False, index=df.index)
+            duplicate[valid] = dedupe.seen(df[valid])
+            reasons = reasons.mask(duplicate, 'Duplicate email or phone')
+            report.invalid += int((~valid).sum())
+            report.duplicates += int(duplicate.sum())
+            rejected = reasons != ''
+            if rejected.any() and len(report.rejected) < MAX_REJECTED_SHOWN:
+                rows = pd.DataFrame({'Row': first_row + (df.index[rejected] - df.index[0]),
+                                     'Name': df.loc[rejected, 'Name'], 'Reason': reasons[rejected]})
+                report.rejected.extend(rows.to_dict('records')[:MAX_REJECTED_SHOWN - len(report.rejected)])
+            accepted = df[~rejected].copy()
+            accepted['Date'] = pd.to_datetime(accepted['Date'], errors='coerce').dt.strftime('%Y-%m-%d')
+            if len(accepted):  # The header goes in with the first accepted rows, once
+                accepted.to_csv(spool_path, mode='a', header=report.imported == 0, index=False)
+                report.imported += len(accepted)
+            if progress is not None:
+                progress(report.rows_read, total)
+        if report.imported:
+            ids = store.allocate_ids(report.imported)
+            store.insert_many(_spooled_rows(spool_path, ids, chunk_size))
+    finally:
+        os.remove(spool_path)
+    return report
+
+
+def _spooled_rows(spool_path: str, ids: List[str], chunk_size: int) -> Iterator[dict]:
+    position = 0
+    for chunk in pd.read_csv(spool_path, dtype=str, keep_default_na=False, chunksize=chunk_size):
+        chunk['ID_Number'] = ids[position:position + len(chunk)]
+        position += len(chunk)
+        yield from chunk.to_dict('records')
+
+
+def default_values(bdm_name: str, entered_by: str) -> dict:
+    return {'BDM_Name': bdm_name, 'Entered_By': entered_by, 'Date': datetime.date.today().isoformat()}
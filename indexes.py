@@ -0,0 +1,245 @@
+import bisect
+import re
+import threading
+from collections import Counter
+from typing import Dict, Hashable, List, NamedTuple, Optional
+
+import pandas as pd
+
+
+# One row-level change to the cached applicant table. label is the row's label
+# in the cached DataFrame; old/new are the row as a dict before and after
+# (None for an insert's old row and a delete's new row).
+class Change(NamedTuple):
+    op: str  # 'insert', 'update' or 'delete'
+    label: Hashable
+    old: Optional[dict]
+    new: Optional[dict]
+
+
+# Base for in-memory structures derived from the applicant table. Each one
+# records the table version it reflects: sync() rebuilds it from scratch when
+# that differs from the DataFrame's (df.attrs['version']), and apply() patches
+# it with the changes of a single write when it is exactly one write behind,
+# so keeping it current costs O(changed rows) instead of O(table).
+class RowIndex:
+    def __init__(self):
+        self.version = None
+        self._lock = threading.RLock()
+
+    def sync(self, df: pd.DataFrame) -> None:
+        version = df.attrs.get('version')
+        with self._lock:
+            if version is None or version != self.version:
+                self.rebuild(df)
+                self.version = version
+
+    def apply(self, before: tuple, after: tuple, changes: Optional[List[Change]]) -> None:
+        with self._lock:
+            if changes is None or self.version != before:
+                self.version = None  # Missed a write; rebuild on the next sync
+                return
+            for change in changes:
+                if change.old is not None and change.new is not None:
+                    self.update(change.label, change.old, change.new)
+                elif change.old is not None:
+                    self.remove(change.label, change.old)
+                else:
+                    self.add(change.label, change.new)
+            self.version = after
+
+    def rebuild(self, df: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def add(self, label: Hashable, row: dict) -> None:
+        raise NotImplementedError
+
+    def remove(self, label: Hashable, row: dict) -> None:
+        raise NotImplementedError
+
+    def update(self, label: Hashable, old: dict, new: dict) -> None:
+        self.remove(label, old)
+        self.add(label, new)
+
+
+# BDM_Name -> labels of that BDM's rows, in table order. A BDM's view and a
+# reassignment touch only that BDM's k rows.
+class BdmIndex(RowIndex):
+    def __init__(self):
+        super().__init__()
+        self._labels = {}  # bdm -> {label: None}, a dict used as an ordered set
+
+    def rebuild(self, df: pd.DataFrame) -> None:
+        self._labels = {}
+        for label, bdm in zip(df.index, df['BDM_Name']):
+            self._labels.setdefault(bdm, {})[label] = None
+
+    def add(self, label: Hashable, row: dict) -> None:
+        self._labels.setdefault(row['BDM_Name'], {})[label] = None
+
+    def remove(self, label: Hashable, row: dict) -> None:
+        labels = self._labels.get(row['BDM_Name'])
+        if labels is not None:
+            labels.pop(label, None)
+            if not labels:
+                del self._labels[row['BDM_Name']]
+
+    def labels(self, bdm_name: str, version: tuple) -> Optional[List[Hashable]]:
+        # None when the index does not describe that version of the table.
+        with self._lock:
+            if version is None or version != self.version:
+                return None
+            return list(self._labels.get(bdm_name, ()))
+
+
+# Type-ahead search over Name, Email_Address, Contact_Number and ID_Number.
+# Every row contributes a few lowercase tokens (name words, the email and its
+# local part, the phone digits, the ID) to one sorted token list, so a prefix
+# lookup is a bisect plus a walk over the matches, and keeping it current is an
+# insort/delete per token. ID_Number -> labels is kept alongside for O(1)
+# selection by ID.
+class SearchIndex(RowIndex):
+    def __init__(self):
+        super().__init__()
+        self._tokens = []  # sorted
+        self._token_labels = []  # label of the row each token in _tokens came from
+        self._row_tokens = {}  # label -> tokens of that row
+        self._ids = {}  # ID_Number -> {label: None}
+
+    @staticmethod
+    def _tokenize(row: dict) -> tuple:
+        tokens = set(re.findall(r'\w+', str(row['Name']).lower()))
+        email = str(row['Email_Address']).strip().lower()
+        if email:
+            tokens.add(email)
+            tokens.add(email.split('@')[0])
+        digits = re.sub(r'\D', '', str(row['Contact_Number']))
+        if digits:
+            tokens.add(digits)
+            tokens.add(digits[-10:])  # National number without the country code
+        id_number = str(row['ID_Number']).strip().lower()
+        if id_number:
+            tokens.add(id_number)
+        tokens.discard('')
+        return tuple(tokens)
+
+    def rebuild(self, df: pd.DataFrame) -> None:
+        pairs = []
+        self._row_tokens = {}
+        self._ids = {}
+        for label, row in zip(df.index, df[['Name', 'Email_Address', 'Contact_Number', 'ID_Number']].to_dict('records')):
+            tokens = self._tokenize(row)
+            self._row_tokens[label] = tokens
+            self._ids.setdefault(row['ID_Number'], {})[label] = None
+            pairs.extend((token, label) for token in tokens)
+        pairs.sort(key=lambda pair: pair[0])
+        self._tokens = [token for token, _ in pairs]
+        self._token_labels = [label for _, label in pairs]
+
+    def add(self, label: Hashable, row: dict) -> None:
+        tokens = self._tokenize(row)
+        self._row_tokens[label] = tokens
+        self._ids.setdefault(row['ID_Number'], {})[label] = None
+        for token in tokens:
+            position = bisect.bisect_right(self._tokens, token)
+            self._tokens.insert(position, token)
+            self._token_labels.insert(position, label)
+
+    def remove(self, label: Hashable, row: dict) -> None:
+        for token in self._row_tokens.pop(label, ()):
+            low = bisect.bisect_left(self._tokens, token)
+            high = bisect.bisect_right(self._tokens, token)
+            position = self._token_labels.index(label, low, high)
+            del self._tokens[position]
+            del self._token_labels[position]
+        labels = self._ids.get(row['ID_Number'])
+        if labels is not None:
+            labels.pop(label, None)
+            if not labels:
+                del self._ids[row['ID_Number']]
+
+    def update(self, label: Hashable, old: dict, new: dict) -> None:
+        # Most edits (a reassignment, a note) leave the searchable fields alone,
+        # and skipping those saves moving every token in the sorted list.
+        if old['ID_Number'] == new['ID_Number'] and set(self._tokenize(new)) == set(self._row_tokens.get(label, ())):
+            return
+        super().update(label, old, new)
+
+    def labels_for_id(self, id_number: str, version: tuple) -> Optional[List[Hashable]]:
+        with self._lock:
+            if version is None or version != self.version:
+                return None
+            return list(self._ids.get(id_number, ()))
+
+    def search(self, query: str, version: tuple, limit: int = 20) -> Optional[List[Hashable]]:
+        # Labels of up to `limit` rows where every word of the query prefixes one
+        # of the row's tokens. Tokens are walked in sorted order, so exact
+        # matches come before longer completions, and the walk stops at `limit`.
+        words = [re.sub(r'\D', '', w) if re.fullmatch(r'[\d+\-]+', w) else w
+                 for w in re.findall(r'[\w@.+-]+', query.lower())]
+        words = [w for w in words if w]
+        with self._lock:
+            if version is None or version != self.version:
+                return None
+            if not words:
+                return []
+            lead = max(words, key=len)  # The longest word is the most selective
+            results = {}
+            position = bisect.bisect_left(self._tokens, lead)
+            while position < len(self._tokens) and len(results) < limit:
+                if not self._tokens[position].startswith(lead):
+                    break
+                label = self._token_labels[position]
+                if label not in results and all(any(t.startswith(w) for t in self._row_tokens[label]) for w in words):
+                    results[label] = None
+                position += 1
+            return list(results)
+
+
+# Pipeline counts: applicants per Type_of_Visa, Country_of_Interest, BDM_Name
+# and week (the Monday of the row's Date, '' when it has none). Each write moves
+# its rows' counts by +/-1; only a sync (a load, or a reload after compaction)
+# counts the table again. Reading them costs O(distinct values), whatever the
+# number of rows.
+class PipelineCounts(RowIndex):
+    DIMENSIONS = ['Type_of_Visa', 'Country_of_Interest', 'BDM_Name']
+
+    def __init__(self):
+        super().__init__()
+        self._counts: Dict[str, Counter] = {}
+
+    @staticmethod
+    def _week(value) -> str:
+        date = pd.to_datetime(value, errors='coerce')
+        if pd.isna(date):
+            return ''
+        return (date.normalize() - pd.Timedelta(days=date.weekday())).date().isoformat()
+
+    def _keys(self, row: dict) -> list:
+        return [(dimension, str(row[dimension])) for dimension in self.DIMENSIONS] + [('Week', self._week(row['Date']))]
+
+    def rebuild(self, df: pd.DataFrame) -> None:
+        self._counts = {}
+        for dimension in self.DIMENSIONS:
+            counts = df[dimension].astype(str).value_counts()
+            self._counts[dimension] = Counter({key: int(n) for key, n in counts.items() if n})
+        dates = pd.to_datetime(df['Date'], errors='coerce').dt.normalize()
+        weeks = (dates - pd.to_timedelta(dates.dt.weekday, unit='D')).dt.strftime('%Y-%m-%d').fillna('')
+        self._counts['Week'] = Counter({key: int(n) for key, n in weeks.value_counts().items() if n})
+
+    def add(self, label: Hashable, row: dict) -> None:
+        for dimension, key in self._keys(row):
+            self._counts.setdefault(dimension, Counter())[key] += 1
+
+    def remove(self, label: Hashable, row: dict) -> None:
+        for dimension, key in self._keys(row):
+            counts = self._counts.setdefault(dimension, Counter())
+            counts[key] -= 1
+            if counts[key] <= 0:
+                del counts[key]
+
+    def counts(self, dimension: str, version: tuple) -> Optional[Dict[str, int]]:
+        with self._lock:
+            if version is None or version != self.version:
+                return None
+            return dict(self._counts.get(dimension, ()))
@@ -0,0 +1,226 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Timing and counter hooks for the app's hot paths. timed() wraps a function
+# and span() a block; each observation lands in a process-wide histogram under
+# its name and in the running totals of the current rerun (per script thread).
+# When disabled, a hook costs one attribute check, so they can stay in place.
+# ONMS_METRICS=0 starts the server with them off; the Diagnostics page can
+# switch them at runtime.
+#
+# Histograms use fixed buckets (seconds), like Prometheus, and keep both
+# lifetime totals (for export) and per-minute slots covering the last
+# WINDOW_SLOTS minutes (for the rolling view).
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+SLOT_SECONDS = 60
+WINDOW_SLOTS = 15
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'Histogram') -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation inside the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS[i - 1] if i > 0 else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(low + (high - low) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'sum_s': self.sum, 'mean_ms': self.sum / self.count * 1000 if self.count else 0.0,
+                'p50_ms': self.quantile(0.5) * 1000, 'p95_ms': self.quantile(0.95) * 1000,
+                'p99_ms': self.quantile(0.99) * 1000, 'max_ms': self.max * 1000}
+
+
+class RollingHistogram:
+    def __init__(self):
+        self.lifetime = Histogram()
+        self._slots = deque()  # (slot number, Histogram), oldest first
+
+    def observe(self, seconds: float, now: float) -> None:
+        self.lifetime.observe(seconds)
+        slot = int(now // SLOT_SECONDS)
+        if not self._slots or self._slots[-1][0] != slot:
+            self._slots.append((slot, Histogram()))
+            while self._slots[0][0] <= slot - WINDOW_SLOTS:
+                self._slots.popleft()
+        self._slots[-1][1].observe(seconds)
+
+    def window(self, now: float) -> Histogram:
+        merged = Histogram()
+        oldest = int(now // SLOT_SECONDS) - WINDOW_SLOTS
+        for slot, histogram in self._slots:
+            if slot > oldest:
+                merged.merge(histogram)
+        return merged
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms: Dict[str, RollingHistogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram()
+            histogram.observe(seconds, time.time())
+        totals = getattr(self._local, 'totals', None)
+        if totals is not None:
+            totals[name] = totals.get(name, 0.0) + seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def _timing(self, name: str):
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            local.depth = depth
+            self.observe(name, elapsed)
+            if depth == 0 and getattr(local, 'totals', None) is not None:
+                local.outermost += elapsed  # Time spent inside any hook, counted once
+
+    def span(self, name: str):
+        return self._timing(name) if self.enabled else _NO_SPAN
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        def decorate(fn: Callable) -> Callable:
+            label = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self._timing(label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # Per-rerun totals: begin_rerun() at the top of a script run, end_rerun() at
+    # the end returns {hook name: seconds} for that run, plus the whole run
+    # ('rerun') and the part no hook covered ('rerun.other': widgets, layout).
+    def begin_rerun(self) -> None:
+        if self.enabled:
+            self._local.totals = {}
+            self._local.outermost = 0.0
+            self._local.rerun_start = time.perf_counter()
+
+    def end_rerun(self) -> Optional[Dict[str, float]]:
+        totals = getattr(self._local, 'totals', None)
+        if totals is None:
+            return None
+        self._local.totals = None
+        elapsed = time.perf_counter() - self._local.rerun_start
+        other = max(elapsed - self._local.outermost, 0.0)
+        self.observe('rerun', elapsed)
+        self.observe('rerun.other', other)
+        return dict(totals, rerun=elapsed, **{'rerun.other': other})
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self.started = time.time()
+
+    def snapshot(self, window: bool = True) -> dict:
+        # {'histograms': {name: summary}, 'counters': {...}}, over the rolling
+        # window or since start/reset.
+        now = time.time()
+        with self._lock:
+            histograms = {name: (h.window(now) if window else h.lifetime) for name, h in self._histograms.items()}
+            counters = dict(self._counters)
+        return {'window_seconds': SLOT_SECONDS * WINDOW_SLOTS if window else now - self.started,
+                'histograms': {name: h.summary() for name, h in sorted(histograms.items())},
+                'buckets': {name: h.counts for name, h in sorted(histograms.items())},
+                'counters': dict(sorted(counters.items()))}
+
+    def to_json(self, window: bool = False) -> str:
+        return json.dumps(dict(self.snapshot(window), bucket_bounds_s=BUCKETS, enabled=self.enabled), indent=2)
+
+    def to_prometheus(self) -> str:
+        # Text exposition format, lifetime totals (Prometheus computes rates).
+        with self._lock:
+            histograms = {name: h.lifetime for name, h in sorted(self._histograms.items())}
+            counters = sorted(self._counters.items())
+        lines = ['# HELP onms_operation_seconds Time spent in instrumented operations.',
+                 '# TYPE onms_operation_seconds histogram']
+        for name, histogram in histograms.items():
+            label = _escape(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ['+Inf'], histogram.counts):
+                cumulative += count
+                lines.append(f'onms_operation_seconds_bucket{{operation="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'onms_operation_seconds_sum{{operation="{label}"}} {histogram.sum}')
+            lines.append(f'onms_operation_seconds_count{{operation="{label}"}} {histogram.count}')
+        lines += ['# HELP onms_events_total Instrumented event counts.', '# TYPE onms_events_total counter']
+        lines += [f'onms_events_total{{event="{_escape(name)}"}} {value}' for name, value in counters]
+        return '\n'.join(lines) + '\n'
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._histograms)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+metrics = Metrics(os.environ.get("ONMS_METRICS", "1") == "1")
+timed = metrics.timed
+span = metrics.span
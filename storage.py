@@ -0,0 +1,1113 @@
+import datetime
+import itertools
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+import pandas as pd
+
+from metrics import metrics, span, timed
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Without pyarrow the columnar snapshot is simply not used
+    pa = pq = None
+
+APPLICANT_COLUMNS = ['Name', 'Contact_Number', 'Address', 'ID_Number', 'Email_Address',
+                     'Country_of_Interest', 'Type_of_Visa', 'Education_Level', 'Diploma',
+                     'Work_Experience', 'Current_Job', 'Travel_History', 'Any_Refusal',
+                     'Signature', 'Date', 'BDM_Name', 'Entered_By']
+VISA_TYPES = ["Student", "Visit", "PR", "Jobseeker", "Business"]
+DIPLOMA_OPTIONS = ["Yes", "No"]
+
+# In memory, low-cardinality columns are categoricals and Date is a datetime
+# column (NaT when empty); everything else is text, '' when empty.
+CATEGORY_COLUMNS = ['Country_of_Interest', 'Type_of_Visa', 'Diploma', 'BDM_Name', 'Entered_By']
+TEXT_COLUMNS = [col for col in APPLICANT_COLUMNS if col not in CATEGORY_COLUMNS and col != 'Date']
+
+META_SHEET = '_onms_meta'
+# Read every column but Date as text, so phone numbers keep their leading zeros
+# and values round-trip through a snapshot unchanged.
+EXCEL_DTYPES = {col: str for col in APPLICANT_COLUMNS if col != 'Date'}
+JOURNAL_BATCH_ROWS = 500  # Rows per insert_many entry in the workbook backend's journal
+SQLITE_POOL_SIZE = 4  # Idle SQLite connections kept open for reuse
+
+
+ID_PREFIX = 'ONMS'
+_ID_PATTERN = re.compile(r'^' + ID_PREFIX + r'(\d+)$')
+
+
+class StorageError(Exception):
+    pass
+
+
+# Helpers shared by every backend
+def parse_dates(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    # Anything not in ISO form (older workbooks) is parsed value by value.
+    retry = dates.isna() & (values.fillna('').astype(str) != '')
+    if retry.any():
+        dates[retry] = pd.to_datetime(values[retry].astype(str), errors='coerce', format='mixed')
+    return dates
+
+
+@timed('normalize')
+def normalize_applicants(df: pd.DataFrame) -> pd.DataFrame:
+    for col in APPLICANT_COLUMNS:
+        if col not in df.columns:
+            df[col] = ''
+    df = df.fillna({col: '' for col in df.columns if col != 'Date'})  # Fill NaN with empty strings
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].astype(str)
+    for col in CATEGORY_COLUMNS:
+        df[col] = df[col].astype(str).astype('category')
+    df['Date'] = parse_dates(df['Date'])
+    return df
+
+
+# Edits to a loaded table. Values arrive as text (see to_cell); these keep the
+# column types above, growing a categorical's categories when a new value
+# appears.
+def set_applicant_values(df: pd.DataFrame, labels: list, values: dict) -> None:
+    for col, value in values.items():
+        if col == 'Date':
+            value = pd.to_datetime(value, errors='coerce')
+        elif isinstance(df[col].dtype, pd.CategoricalDtype) and value not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories([value])
+        df.loc[labels, col] = value
+
+
+def append_applicants(df: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    rows = normalize_applicants(rows)
+    for col in CATEGORY_COLUMNS:
+        missing = rows[col].cat.categories.difference(df[col].cat.categories)
+        if len(missing):
+            df[col] = df[col].cat.add_categories(missing)
+        rows[col] = rows[col].cat.set_categories(df[col].cat.categories)
+    return pd.concat([df, rows])
+
+
+def read_applicants_excel(filepath: str) -> pd.DataFrame:
+    with span('workbook_parse'):
+        df = pd.read_excel(filepath, dtype=EXCEL_DTYPES)
+    return normalize_applicants(df)
+
+
+def to_cell(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value is pd.NaT:
+        return ''
+    if isinstance(value, (pd.Timestamp, datetime.datetime)):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # Phone numbers read from Excel come back as floats
+    return str(value)
+
+
+# Applicant IDs are ONMS followed by a sequence number padded to four digits.
+# Past ONMS9999 the number simply gets wider, so compare IDs by their
+# parse_applicant_id number rather than as plain strings.
+def format_applicant_id(number: int) -> str:
+    return f"{ID_PREFIX}{number:04d}"
+
+
+def parse_applicant_id(value) -> Optional[int]:
+    match = _ID_PATTERN.match(str(value).strip())
+    return int(match.group(1)) if match else None
+
+
+def next_id_number(ids: Iterable) -> int:
+    highest = 0
+    for value in ids:
+        number = parse_applicant_id(value)  # Malformed IDs are skipped, not fatal
+        if number is not None and number > highest:
+            highest = number
+    return highest + 1
+
+
+# Cross-process exclusive lock on "<path>.lock". Re-entrant within a thread, and
+# one instance per path is shared by the whole process (see file_lock) so that
+# sessions in this server and other server processes all queue on the same lock.
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path + '.lock'
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self) -> 'FileLock':
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                            pass
+            except BaseException:
+                os.close(fd)
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def file_lock(path: str) -> FileLock:
+    key = os.path.abspath(path)
+    with _file_locks_guard:
+        lock = _file_locks.get(key)
+        if lock is None:
+            lock = _file_locks[key] = FileLock(key)
+        return lock
+
+
+def _fsync_directory(directory: str) -> None:
+    if fcntl is None:
+        return  # Directories cannot be opened for fsync on Windows
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Workbooks are written to a temp file next to the target, fsync'd and renamed
+# into place, so readers and crashes only ever see the old or the new file whole.
+def write_excel_temp(df: pd.DataFrame, filepath: str, meta: Optional[dict] = None) -> str:
+    directory = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filepath) + '.',
+                                    suffix='.tmp' + os.path.splitext(filepath)[1])
+    os.close(fd)
+    try:
+        with span('to_excel'), pd.ExcelWriter(tmp_path, engine='openpyxl') as writer:
+            df.to_excel(writer, index=False)
+            if meta is not None:
+                pd.DataFrame([meta]).to_excel(writer, sheet_name=META_SHEET, index=False)
+        with open(tmp_path, 'r+b') as f:
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+# mkstemp creates files readable by the owner only; a replaced file keeps the
+# mode of the one it replaces, and a new one gets what open() would have given.
+_umask = os.umask(0)
+os.umask(_umask)
+DEFAULT_FILE_MODE = 0o666 & ~_umask
+
+
+def _file_mode(filepath: str) -> int:
+    try:
+        return os.stat(filepath).st_mode & 0o7777
+    except FileNotFoundError:
+        return DEFAULT_FILE_MODE
+
+
+def replace_file(tmp_path: str, filepath: str) -> None:
+    try:
+        os.chmod(tmp_path, _file_mode(filepath))
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    _fsync_directory(os.path.dirname(os.path.abspath(filepath)))
+
+
+def atomic_write_excel(df: pd.DataFrame, filepath: str, meta: Optional[dict] = None) -> None:
+    replace_file(write_excel_temp(df, filepath, meta), filepath)
+
+
+# Deferred workbook saves. save_pending() writes the new contents to
+# "<file>.pending" (JSON, fsync'd and renamed into place) and returns; that file
+# is the durable record of the change, and read_latest_excel() prefers it to
+# the workbook, so readers in this process and in others see the change at
+# once. flush_pending() rewrites the workbook from it later, off the request
+# thread (see WriteBehind), and removes it. A crash before the flush loses
+# nothing: the pending file is still there for the next flush.
+def pending_path(filepath: str) -> str:
+    return filepath + '.pending'
+
+
+def _stat_signature(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)  # Each replace is a new inode
+
+
+def latest_signature(filepath: str) -> Optional[tuple]:
+    pending, workbook = _stat_signature(pending_path(filepath)), _stat_signature(filepath)
+    return (pending, workbook) if pending or workbook else None
+
+
+def save_pending(df: pd.DataFrame, filepath: str) -> None:
+    path = pending_path(filepath)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(df.to_json(orient='table', date_format='iso'))
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    with file_lock(filepath):
+        replace_file(tmp_path, path)
+
+
+def _read_pending(filepath: str) -> pd.DataFrame:
+    with open(pending_path(filepath), encoding='utf-8') as f:
+        return pd.read_json(f, orient='table')
+
+
+def read_latest_excel(filepath: str) -> pd.DataFrame:
+    try:
+        return _read_pending(filepath)
+    except FileNotFoundError:
+        return pd.read_excel(filepath)
+
+
+def flush_pending(filepath: str) -> bool:
+    # False if there was nothing to write. The workbook is only replaced if the
+    # pending file is still the one we read: if a newer save (or another
+    # process's flush) got there first, that one wins and ours is dropped.
+    path = pending_path(filepath)
+    with file_lock(filepath):
+        signature = _stat_signature(path)
+        if signature is None:
+            return False
+        df = _read_pending(filepath)
+    tmp_path = write_excel_temp(df, filepath)
+    with file_lock(filepath):
+        if _stat_signature(path) != signature:
+            os.remove(tmp_path)
+            return False
+        replace_file(tmp_path, filepath)
+        os.remove(path)
+    return True
+
+
+# Parquet copy of a store's data at "<file>.parquet", tagged with the key of the
+# data it was taken from (the store's version, or the workbook's signature) and
+# read in its place while that key still matches. A columnar read with the
+# column types already in the file is far quicker than parsing the workbook or
+# building the frame row by row, and it can be memory-mapped. The stores only
+# rewrite it from the background thread (see refresh_snapshot), so a stale
+# copy is never worse than a normal load.
+class ColumnarSnapshot:
+    KEY = b'onms_key'
+    EXTRA = b'onms_extra'
+
+    def __init__(self, path: str, memory_map: bool = False):
+        self.path = path
+        self.memory_map = memory_map
+
+    @staticmethod
+    def _encode(key: tuple) -> bytes:
+        return json.dumps(list(key)).encode('utf-8')
+
+    def key(self) -> Optional[bytes]:
+        try:
+            return (pq.read_metadata(self.path).metadata or {}).get(self.KEY)
+        except (OSError, pa.ArrowException):
+            return None
+
+    def is_current(self, key: tuple) -> bool:
+        return self.key() == self._encode(key)
+
+    @timed('parquet_read')
+    def read(self, key: tuple) -> Optional[tuple]:
+        # (df, extra) if the file holds the data for key, else None. The key is
+        # checked in the footer first, so a stale copy costs no table read; it
+        # is checked again on the table in case the file was replaced between.
+        if not self.is_current(key):
+            return None
+        try:
+            table = pq.read_table(self.path, memory_map=self.memory_map)
+        except (OSError, pa.ArrowException):
+            return None
+        metadata = table.schema.metadata or {}
+        if metadata.get(self.KEY) != self._encode(key):
+            return None
+        extra = json.loads(metadata.get(self.EXTRA, b'null'))
+        df = table.to_pandas()
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(str).astype('category')  # An empty table loses the dictionary type
+        return df, extra
+
+    @timed('parquet_write')
+    def write(self, df: pd.DataFrame, key: tuple, extra=None) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[self.KEY] = self._encode(key)
+        metadata[self.EXTRA] = json.dumps(extra).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(self.path) + '.', suffix='.tmp')
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp_path)
+            replace_file(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def columnar_snapshot(filepath: str, enabled: bool, memory_map: bool) -> Optional[ColumnarSnapshot]:
+    if not enabled or pq is None:
+        return None
+    return ColumnarSnapshot(filepath + '.parquet', memory_map)
+
+
+# Storage backends. Every backend exposes the same row-level operations keyed by
+# ID_Number, plus a version() token that changes whenever the data does so the
+# app can tell when its cached copy is stale, and a compact() step that a
+# background thread runs periodically to fold the write log into the main file.
+# Row-level writes return the (before, after) pair of version tokens around the
+# write, which lets the app patch its cached copy instead of reloading it.
+# IDs come from a persistent sequence: allocate_ids hands out a block of
+# consecutive IDs under the store's write lock, seeding the sequence from the
+# existing IDs the first time it is used. Updates and deletes address rows by
+# ID_Number, so ensure_unique_ids runs when a store is opened and gives every
+# blank or repeated ID (hand-entered books) a fresh one; the first row with a
+# given ID keeps it.
+class ApplicantStore:
+    def version(self) -> tuple:
+        raise NotImplementedError
+
+    def load_all(self) -> pd.DataFrame:
+        # The whole table, with the version it was read at in df.attrs['version'].
+        raise NotImplementedError
+
+    def insert(self, row: dict) -> tuple:
+        raise NotImplementedError
+
+    def insert_many(self, rows: Iterable[dict]) -> tuple:
+        raise NotImplementedError
+
+    def update(self, id_number: str, data: dict) -> tuple:
+        raise NotImplementedError
+
+    def delete(self, id_number: str) -> tuple:
+        raise NotImplementedError
+
+    def reassign_bdm(self, old_bdm: str, new_bdm: str) -> tuple:
+        raise NotImplementedError
+
+    def replace_all(self, df: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def allocate_ids(self, count: int = 1) -> List[str]:
+        raise NotImplementedError
+
+    def compact(self) -> None:
+        pass
+
+    def refresh_snapshot(self) -> None:
+        pass
+
+    def is_empty(self) -> bool:
+        return self.load_all().empty
+
+    def ensure_unique_ids(self) -> int:
+        # Returns the number of rows given a new ID.
+        df = self.load_all()
+        bad = (df['ID_Number'].str.strip() == '') | df['ID_Number'].duplicated()
+        if not bad.any():
+            return 0
+        df = df.copy()
+        df.loc[bad, 'ID_Number'] = self.allocate_ids(int(bad.sum()))
+        self.replace_all(df)
+        return int(bad.sum())
+
+    def import_excel(self, filepath: str) -> int:
+        df = read_applicants_excel(filepath)
+        self.replace_all(df)
+        return len(df)
+
+    def export_excel(self, filepath: str) -> int:
+        df = self.load_all()
+        with file_lock(filepath):
+            atomic_write_excel(df, filepath)
+        return len(df)
+
+    def start_compaction(self, interval: float) -> None:
+        if getattr(self, '_compactor', None) is None:
+            self._compactor = Compactor(self, interval)
+            self._compactor.start()
+
+    def close(self) -> None:
+        compactor = getattr(self, '_compactor', None)
+        if compactor is not None:
+            compactor.stop()
+            self._compactor = None
+
+
+class Compactor(threading.Thread):
+    def __init__(self, store: ApplicantStore, interval: float):
+        super().__init__(name='onms-compactor', daemon=True)
+        self.store = store
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        self._refresh()  # A cold process leaves a current snapshot for the next one
+        while not self._stopped.wait(self.interval):
+            try:
+                self.store.compact()
+            except Exception:
+                pass  # Nothing is lost: the log stays in place and is retried next round
+            self._refresh()
+
+    def _refresh(self) -> None:
+        try:
+            self.store.refresh_snapshot()
+        except Exception:
+            pass  # Readers fall back to the source files until the next round
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+class Ticket(NamedTuple):
+    key: str
+    seq: int
+
+
+# The background writer: one thread that runs queued flushes in order.
+# submit(key, flush) returns a Ticket at once; while a key is waiting, later
+# submissions for it replace its flush, so a burst of saves to one file costs
+# one rewrite (the thread waits `delay` seconds before each flush to let a
+# burst land). The queue is bounded: with maxsize keys waiting, submit blocks
+# until the writer catches up. A failed flush stays queued and is retried
+# every retry_interval seconds until it succeeds or a newer one replaces it.
+# Sessions poll status(ticket); close() runs everything still queued.
+class WriteBehind(threading.Thread):
+    def __init__(self, maxsize: int = 64, delay: float = 0.2, retry_interval: float = 5.0):
+        super().__init__(name='onms-writer', daemon=True)
+        self.delay = delay
+        self.retry_interval = retry_interval
+        self._queue = queue.Queue(maxsize)
+        self._jobs = {}  # key -> (seq, flush) waiting to run
+        self._written = {}  # key -> seq of the last successful flush
+        self._errors = {}  # key -> (seq, message) of the last failed flush
+        self._failed = set()
+        self._retry_at = 0.0
+        self._seq = 0
+        self._closed = False
+        self._changed = threading.Condition()
+
+    def submit(self, key: str, flush: Callable[[], object]) -> Ticket:
+        with self._changed:
+            if self._closed:
+                raise StorageError("The background writer has shut down")
+            self._seq += 1
+            waiting = key in self._jobs
+            self._jobs[key] = (self._seq, flush)
+            ticket = Ticket(key, self._seq)
+        metrics.count('writer.coalesced' if waiting else 'writer.queued')
+        if not waiting:
+            self._queue.put(key)
+        return ticket
+
+    def status(self, ticket: Ticket) -> tuple:
+        # ('written', None), ('queued', None) or ('failed', message)
+        with self._changed:
+            return self._status(ticket)
+
+    def _status(self, ticket: Ticket) -> tuple:
+        if self._written.get(ticket.key, 0) >= ticket.seq:
+            return 'written', None
+        seq, message = self._errors.get(ticket.key, (0, None))
+        return ('failed', message) if seq >= ticket.seq else ('queued', None)
+
+    def wait(self, ticket: Ticket, timeout: Optional[float] = None) -> tuple:
+        with self._changed:
+            self._changed.wait_for(lambda: self._status(ticket)[0] != 'queued', timeout)
+            return self._status(ticket)
+
+    def run(self) -> None:
+        while True:
+            try:
+                key = self._queue.get(timeout=self.retry_interval if self._failed else None)
+            except queue.Empty:
+                key = ''
+            if key is None:
+                break
+            if key:
+                if not self._closed:
+                    time.sleep(self.delay)
+                self._flush(key)
+            if self._failed and time.monotonic() >= self._retry_at:
+                for failed in list(self._failed):
+                    self._flush(failed)
+        for key in list(self._jobs):  # Shutting down: last attempt at anything left
+            self._flush(key)
+
+    def _flush(self, key: str) -> None:
+        with self._changed:
+            self._failed.discard(key)
+            job = self._jobs.pop(key, None)
+        if job is None:
+            return
+        seq, flush = job
+        try:
+            with span('writer.flush'):
+                flush()
+        except Exception as e:
+            metrics.count('writer.failed')
+            with self._changed:
+                self._errors[key] = (seq, str(e))
+                self._jobs.setdefault(key, job)  # Unless a newer one was submitted meanwhile
+                self._failed.add(key)
+                self._retry_at = time.monotonic() + self.retry_interval
+                self._changed.notify_all()
+            return
+        with self._changed:
+            self._written[key] = seq
+            self._changed.notify_all()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        with self._changed:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)  # Behind everything already queued
+        self.join(timeout)
+
+
+# Workbook backend. The xlsx is a snapshot; every change is appended to
+# "<file>.journal" (one JSON object per line, fsync'd before the call returns)
+# under the file lock, so a change costs one small append whatever the book
+# size and concurrent writers queue instead of overwriting each other.
+# compact() folds the journal into a fresh snapshot. Entries carry a sequence
+# number and the snapshot records the last one it contains (in the META_SHEET
+# sheet), so entries are never applied twice if a compaction is interrupted.
+class ExcelApplicantStore(ApplicantStore):
+    def __init__(self, filepath: str, compact_after: int = 1, columnar: bool = True, memory_map: bool = False):
+        self.filepath = filepath
+        self.journal_path = filepath + '.journal'
+        self.sequence_path = filepath + '.seq'
+        self.compact_after = compact_after
+        self.snapshot = columnar_snapshot(filepath, columnar, memory_map)
+
+    def version(self) -> tuple:
+        return ('excel', self.filepath) + self._signature(self.filepath) + self._signature(self.journal_path)
+
+    @staticmethod
+    def _signature(path: str) -> tuple:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return (0, 0)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _read_snapshot(self) -> tuple:
+        if not os.path.exists(self.filepath):
+            return normalize_applicants(pd.DataFrame(columns=APPLICANT_COLUMNS)), 0
+        # The Parquet copy mirrors the workbook, keyed by its mtime and size.
+        if self.snapshot is not None:
+            found = self.snapshot.read(self._signature(self.filepath))
+            if found is not None:
+                return found
+        return self._read_workbook()
+
+    def _read_workbook(self) -> tuple:
+        with span('workbook_parse'):
+            sheets = pd.read_excel(self.filepath, sheet_name=None, dtype=EXCEL_DTYPES)
+        meta = sheets.pop(META_SHEET, None)
+        seq = int(meta['seq'].iloc[0]) if meta is not None and not meta.empty else 0
+        df = next(iter(sheets.values())) if sheets else pd.DataFrame(columns=APPLICANT_COLUMNS)
+        return normalize_applicants(df), seq
+
+    def _read_journal(self) -> List[dict]:
+        entries = []
+        if not os.path.exists(self.journal_path):
+            return entries
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn tail of a write that never returned
+                if 'seq' in entry:
+                    entries.append(entry)
+        return entries
+
+    @staticmethod
+    @timed('journal_replay')
+    def _replay(df: pd.DataFrame, entries: List[dict]) -> pd.DataFrame:
+        if not entries:
+            return df
+        records = df.to_dict('records')
+        positions = {}  # ID_Number -> positions in records; deleted records become None
+        for i, record in enumerate(records):
+            positions.setdefault(record['ID_Number'], []).append(i)
+        for entry in entries:
+            op = entry['op']
+            if op in ('insert', 'insert_many'):
+                for row in entry['rows'] if op == 'insert_many' else [entry['row']]:
+                    positions.setdefault(row['ID_Number'], []).append(len(records))
+                    records.append(dict(row))
+            elif op == 'update':
+                for i in positions.get(entry['id'], []):
+                    records[i].update(entry['data'])
+            elif op == 'delete':
+                for i in positions.pop(entry['id'], []):
+                    records[i] = None
+            elif op == 'reassign':
+                for record in records:
+                    if record is not None and record['BDM_Name'] == entry['old']:
+                        record['BDM_Name'] = entry['new']
+        records = [r for r in records if r is not None]
+        return normalize_applicants(pd.DataFrame(records, columns=df.columns))
+
+    def load_all(self) -> pd.DataFrame:
+        # Journal first: compaction replaces the snapshot before it trims the
+        # journal, so this order never misses an entry. The read is repeated if
+        # either file changed meanwhile, so df.attrs['version'] is the version
+        # the rows belong to.
+        while True:
+            version = self.version()
+            entries = self._read_journal()
+            df, seq = self._read_snapshot()
+            df = self._replay(df, [e for e in entries if e['seq'] > seq])
+            if self.version() == version:
+                df.attrs['version'] = version
+                return df
+
+    def _last_seq(self) -> int:
+        # Sequence number of the last complete line. The file is read backwards
+        # a block at a time until a whole line parses, so a long entry is never
+        # mistaken for a torn one.
+        size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if size:
+            with open(self.journal_path, 'rb') as f:
+                end, head = size, b''
+                while end > 0:
+                    start = max(0, end - 64 * 1024)
+                    f.seek(start)
+                    lines = (f.read(end - start) + head).split(b'\n')
+                    head = lines.pop(0) if start > 0 else b''  # May continue in the block before
+                    end = start
+                    for line in reversed(lines):
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        return entry.get('seq', entry.get('base', 0))
+        return self._read_snapshot()[1]
+
+    def _append(self, entries: Iterable[dict]) -> tuple:
+        # Entries get consecutive sequence numbers and are written as they are
+        # produced, then fsync'd once. If producing them fails part way, the
+        # journal is cut back to where it was, so the call lands all or nothing.
+        try:
+            with file_lock(self.filepath):
+                before = self.version()
+                seq = self._last_seq()
+                with open(self.journal_path, 'ab') as f:
+                    if f.tell() > 0:
+                        with open(self.journal_path, 'rb') as tail:
+                            tail.seek(-1, os.SEEK_END)
+                            if tail.read(1) != b'\n':
+                                f.write(b'\n')  # Close off a torn line before appending
+                    start = f.tell()
+                    try:
+                        for entry in entries:
+                            seq += 1
+                            f.write(json.dumps(dict(entry, seq=seq)).encode('utf-8') + b'\n')
+                    except BaseException:
+                        f.truncate(start)
+                        raise
+                    f.flush()
+                    os.fsync(f.fileno())
+                return before, self.version()
+        except OSError as e:
+            raise StorageError(str(e)) from e
+
+    def _rewrite_journal(self, base: int, entries: List[dict]) -> None:
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps({'base': base}).encode('utf-8') + b'\n')
+            for entry in entries:
+                f.write(json.dumps(entry).encode('utf-8') + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def insert(self, row: dict) -> tuple:
+        return self._append([{'op': 'insert', 'row': {col: to_cell(row.get(col, '')) for col in APPLICANT_COLUMNS}}])
+
+    def insert_many(self, rows: Iterable[dict]) -> tuple:
+        # Batches of JOURNAL_BATCH_ROWS rows per entry keep journal lines short,
+        # and only one batch is held in memory at a time.
+        return self._append(self._insert_batches(rows))
+
+    @staticmethod
+    def _insert_batches(rows: Iterable[dict]) -> Iterable[dict]:
+        cells = ({col: to_cell(row.get(col, '')) for col in APPLICANT_COLUMNS} for row in rows)
+        while True:
+            batch = list(itertools.islice(cells, JOURNAL_BATCH_ROWS))
+            if not batch:
+                return
+            yield {'op': 'insert_many', 'rows': batch}
+
+    def update(self, id_number: str, data: dict) -> tuple:
+        changes = {col: to_cell(value) for col, value in data.items() if col in APPLICANT_COLUMNS}
+        return self._append([{'op': 'update', 'id': id_number, 'data': changes}])
+
+    def delete(self, id_number: str) -> tuple:
+        return self._append([{'op': 'delete', 'id': id_number}])
+
+    def reassign_bdm(self, old_bdm: str, new_bdm: str) -> tuple:
+        return self._append([{'op': 'reassign', 'old': old_bdm, 'new': new_bdm}])
+
+    def export_excel(self, filepath: str) -> int:
+        if os.path.abspath(filepath) == os.path.abspath(self.filepath):
+            self.compact()  # The snapshot already is the workbook export
+            return len(self.load_all())
+        return super().export_excel(filepath)
+
+    def replace_all(self, df: pd.DataFrame) -> None:
+        try:
+            with file_lock(self.filepath):
+                seq = self._last_seq()
+                atomic_write_excel(df, self.filepath, meta={'seq': seq})
+                self._rewrite_journal(seq, [])
+                next_number = self._read_sequence()
+                if next_number is not None:
+                    self._write_sequence(max(next_number, next_id_number(df['ID_Number'])))
+        except OSError as e:
+            raise StorageError(str(e)) from e
+
+    def _read_sequence(self) -> Optional[int]:
+        try:
+            with open(self.sequence_path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_sequence(self, next_number: int) -> None:
+        tmp_path = self.sequence_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(next_number))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.sequence_path)
+
+    def allocate_ids(self, count: int = 1) -> List[str]:
+        try:
+            with file_lock(self.filepath):
+                first = self._read_sequence()
+                if first is None:
+                    first = next_id_number(self.load_all()['ID_Number'])
+                self._write_sequence(first + count)
+        except OSError as e:
+            raise StorageError(str(e)) from e
+        return [format_applicant_id(n) for n in range(first, first + count)]
+
+    def ensure_unique_ids(self) -> int:
+        with file_lock(self.filepath):
+            return super().ensure_unique_ids()
+
+    def refresh_snapshot(self) -> None:
+        if self.snapshot is None or not os.path.exists(self.filepath):
+            return
+        signature = self._signature(self.filepath)
+        if not self.snapshot.is_current(signature):
+            df, seq = self._read_workbook()
+            self.snapshot.write(df, signature, seq)
+
+    def compact(self) -> None:
+        pending = self._read_journal()
+        if len(pending) < self.compact_after:
+            return
+        # Build the new snapshot without holding the lock so writers are not
+        # blocked behind to_excel; entries appended meanwhile stay in the journal.
+        snapshot_signature = self._signature(self.filepath)
+        df, seq = self._read_snapshot()
+        folded = [e for e in pending if e['seq'] > seq]
+        if not folded:
+            return
+        last = max(e['seq'] for e in folded)
+        df = self._replay(df, folded)
+        tmp_path = write_excel_temp(df, self.filepath, meta={'seq': last})
+        try:
+            with file_lock(self.filepath):
+                # Another process may have compacted or replaced the book meanwhile.
+                if self._signature(self.filepath) != snapshot_signature:
+                    os.remove(tmp_path)
+                    return
+                replace_file(tmp_path, self.filepath)
+                self._rewrite_journal(last, [e for e in self._read_journal() if e['seq'] > last])
+                signature = self._signature(self.filepath)
+        except OSError as e:
+            raise StorageError(str(e)) from e
+        if self.snapshot is not None:
+            self.snapshot.write(df, signature, last)
+
+
+# SQLite backend: one row per applicant, indexed on the columns the app looks
+# rows up by, so a single edit is a single-row statement whatever the book size.
+# The database runs in WAL mode with synchronous=FULL: each commit is an fsync'd
+# append to the write-ahead log, BEGIN IMMEDIATE serialises writers across
+# sessions and processes, and compact() checkpoints the log back into the main
+# file from the background thread instead of on a user's commit. A revision
+# counter in the meta table is bumped in the same transaction as every write
+# and serves as the version token.
+class SQLiteApplicantStore(ApplicantStore):
+    def __init__(self, filepath: str, columnar: bool = True, memory_map: bool = False):
+        self.filepath = filepath
+        self.snapshot = columnar_snapshot(filepath, columnar, memory_map)
+        self._idle = []  # Pooled connections not in use
+        self._pool_lock = threading.Lock()
+        self._column_list = ', '.join(f'"{col}"' for col in APPLICANT_COLUMNS)
+        self._placeholders = ', '.join('?' for _ in APPLICANT_COLUMNS)
+        self._create_schema()
+
+    # Connections are pooled rather than kept per thread: Streamlit runs every
+    # rerun on a new script thread, so a per-thread connection would be opened
+    # (with its PRAGMAs) on each rerun and left for the garbage collector. A
+    # connection is used by one thread at a time, so check_same_thread is off.
+    @contextmanager
+    def _connection(self):
+        with self._pool_lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = sqlite3.connect(self.filepath, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute('PRAGMA wal_autocheckpoint=0')
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            with self._pool_lock:
+                if len(self._idle) < SQLITE_POOL_SIZE:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def _transaction(self, body: Callable[[sqlite3.Connection], object], bump_revision: bool = True) -> tuple:
+        try:
+            with self._connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    revision = self._revision(conn)
+                    body(conn)
+                    if bump_revision:
+                        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+        after = revision + 1 if bump_revision else revision
+        return ('sqlite', self.filepath, revision), ('sqlite', self.filepath, after)
+
+    def _create_schema(self) -> None:
+        columns = ', '.join(f'"{col}" TEXT NOT NULL DEFAULT \'\'' for col in APPLICANT_COLUMNS)
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS applicants ({columns})')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_applicants_id_number ON applicants ("ID_Number")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_applicants_bdm_name ON applicants ("BDM_Name")')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_applicants_name ON applicants ("Name")')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+            conn.execute('COMMIT')
+
+    def _row_values(self, row: dict) -> List[str]:
+        return [to_cell(row.get(col, '')) for col in APPLICANT_COLUMNS]
+
+    @staticmethod
+    def _revision(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def version(self) -> tuple:
+        with self._connection() as conn:
+            return ('sqlite', self.filepath, self._revision(conn))
+
+    def is_empty(self) -> bool:
+        return self.version()[2] == 0
+
+    def load_all(self) -> pd.DataFrame:
+        # df.attrs['version'] is the revision the rows were read at.
+        if self.snapshot is not None:
+            version = self.version()
+            found = self.snapshot.read(version)
+            if found is not None:
+                found[0].attrs['version'] = version
+                return found[0]
+        version, df = self._read_table()
+        df.attrs['version'] = version
+        return df
+
+    def _read_table(self) -> tuple:
+        # Revision and rows from one read transaction, so they always agree.
+        with self._connection() as conn:
+            conn.execute('BEGIN')
+            try:
+                version = ('sqlite', self.filepath, self._revision(conn))
+                with span('sql_read'):
+                    df = pd.read_sql_query(f'SELECT {self._column_list} FROM applicants ORDER BY rowid', conn)
+            finally:
+                conn.execute('COMMIT')
+        return version, normalize_applicants(df)
+
+    def refresh_snapshot(self) -> None:
+        if self.snapshot is not None and not self.snapshot.is_current(self.version()):
+            version, df = self._read_table()
+            self.snapshot.write(df, version)
+
+    def insert(self, row: dict) -> tuple:
+        sql = f'INSERT INTO applicants ({self._column_list}) VALUES ({self._placeholders})'
+        return self._transaction(lambda conn: conn.execute(sql, self._row_values(row)))
+
+    def insert_many(self, rows: Iterable[dict]) -> tuple:
+        sql = f'INSERT INTO applicants ({self._column_list}) VALUES ({self._placeholders})'
+        return self._transaction(lambda conn: conn.executemany(sql, (self._row_values(row) for row in rows)))
+
+    def update(self, id_number: str, data: dict) -> tuple:
+        columns = [col for col in data if col in APPLICANT_COLUMNS]
+        if not columns:
+            version = self.version()
+            return version, version
+        assignments = ', '.join(f'"{col}" = ?' for col in columns)
+        params = [to_cell(data[col]) for col in columns] + [id_number]
+        sql = f'UPDATE applicants SET {assignments} WHERE "ID_Number" = ?'
+        return self._transaction(lambda conn: self._single_row(conn.execute(sql, params), id_number))
+
+    def delete(self, id_number: str) -> tuple:
+        sql = 'DELETE FROM applicants WHERE "ID_Number" = ?'
+        return self._transaction(lambda conn: self._single_row(conn.execute(sql, [id_number]), id_number))
+
+    @staticmethod
+    def _single_row(cursor: sqlite3.Cursor, id_number: str) -> None:
+        # Raising inside the transaction rolls the statement back.
+        if cursor.rowcount > 1:
+            raise StorageError(f"ID_Number {id_number!r} matches {cursor.rowcount} applicants; nothing was changed")
+
+    def reassign_bdm(self, old_bdm: str, new_bdm: str) -> tuple:
+        return self._transaction(lambda conn: conn.execute('UPDATE applicants SET "BDM_Name" = ? WHERE "BDM_Name" = ?',
+                                                    [new_bdm, old_bdm]))
+
+    def replace_all(self, df: pd.DataFrame) -> None:
+        rows = [self._row_values(row) for row in df.to_dict('records')]
+
+        def body(conn: sqlite3.Connection) -> None:
+            conn.execute('DELETE FROM applicants')
+            conn.executemany(f'INSERT INTO applicants ({self._column_list}) VALUES ({self._placeholders})', rows)
+            # Never hand out an ID that is already in the imported data.
+            conn.execute("UPDATE meta SET value = max(value, ?) WHERE key = 'next_id'",
+                         [next_id_number(df['ID_Number'])])
+        self._transaction(body)
+
+    @staticmethod
+    def _reserve_ids(conn: sqlite3.Connection, count: int) -> int:
+        # First number of a block of count, taken from the sequence in meta.
+        row = conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        if row is None:
+            ids = conn.execute('SELECT "ID_Number" FROM applicants WHERE "ID_Number" LIKE ?', [ID_PREFIX + '%'])
+            start = next_id_number(value for (value,) in ids)
+        else:
+            start = row[0]
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_id', ?)", [start + count])
+        return start
+
+    def allocate_ids(self, count: int = 1) -> List[str]:
+        first = []
+        self._transaction(lambda conn: first.append(self._reserve_ids(conn, count)), bump_revision=False)
+        return [format_applicant_id(n) for n in range(first[0], first[0] + count)]
+
+    def ensure_unique_ids(self) -> int:
+        # In SQL, so opening the store does not read the whole table.
+        sql = ('SELECT rowid FROM applicants AS a WHERE trim("ID_Number") = \'\' OR EXISTS '
+               '(SELECT 1 FROM applicants AS b WHERE b."ID_Number" = a."ID_Number" AND b.rowid < a.rowid) ORDER BY rowid')
+        with self._connection() as conn:
+            if conn.execute(sql).fetchone() is None:
+                return 0
+        renumbered = []
+
+        def body(conn: sqlite3.Connection) -> None:
+            rowids = [rowid for (rowid,) in conn.execute(sql)]
+            start = self._reserve_ids(conn, len(rowids))
+            conn.executemany('UPDATE applicants SET "ID_Number" = ? WHERE rowid = ?',
+                             [(format_applicant_id(start + i), rowid) for i, rowid in enumerate(rowids)])
+            renumbered.extend(rowids)
+        self._transaction(body)
+        return len(renumbered)
+
+    def compact(self) -> None:
+        with self._connection() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self) -> None:
+        super().close()
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def open_applicant_store(backend: str, sqlite_path: str, excel_path: str, columnar: bool = True,
+                         memory_map: bool = False) -> ApplicantStore:
+    if backend == 'excel':
+        store = ExcelApplicantStore(excel_path, columnar=columnar, memory_map=memory_map)
+    else:
+        store = SQLiteApplicantStore(sqlite_path, columnar=columnar, memory_map=memory_map)
+        # First run against an existing deployment: seed the database from the workbook.
+        if store.is_empty() and os.path.exists(excel_path):
+            store.import_excel(excel_path)
+    store.ensure_unique_ids()
+    return store
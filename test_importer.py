@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from importer import default_values, import_applicants
+from storage import ExcelApplicantStore, SQLiteApplicantStore, StorageError
+
+
+def _open_store(backend, tmp_path):
+    if backend == 'excel':
+        return ExcelApplicantStore(str(tmp_path / 'onms_applicants.xlsx'), columnar=False)
+    return SQLiteApplicantStore(str(tmp_path / 'onms_applicants.db'), columnar=False)
+
+
+def _import(store, csv, chunk_size=3):
+    return import_applicants(io.BytesIO(csv.encode('utf-8')), 'leads.csv', store, store.load_all(),
+                             default_values('', 'admin'), set(), chunk_size=chunk_size)
+
+
+# A first chunk with nothing accepted (here, no names) must not leave a header
+# line in the spool for the next chunk to repeat.
+@pytest.mark.parametrize('backend', ['sqlite', 'excel'])
+def test_import_after_fully_rejected_first_chunk(backend, tmp_path):
+    store = _open_store(backend, tmp_path)
+    csv = 'Name,Email\n,a@example.com\n,b@example.com\n,c@example.com\n' \
+          'D,d@example.com\nE,e@example.com\nF,f@example.com\n'
+    report = _import(store, csv)
+    assert (report.rows_read, report.imported, report.invalid) == (6, 3, 3)
+    df = store.load_all()
+    assert sorted(df['Name']) == ['D', 'E', 'F']
+    assert df['ID_Number'].is_unique
+
+
+def test_excel_insert_many_is_all_or_nothing(tmp_path):
+    store = _open_store('excel', tmp_path)
+    store.insert({'Name': 'Existing', 'ID_Number': 'ONMS0001'})
+
+    def rows():
+        for i in range(1200):  # More than two journal entries' worth
+            yield {'Name': f'Row {i}', 'ID_Number': f'ONMS{i + 2:04d}'}
+        raise StorageError('source went away')
+    with pytest.raises(StorageError):
+        store.insert_many(rows())
+    assert store.load_all()['Name'].tolist() == ['Existing']
+    store.insert({'Name': 'Next', 'ID_Number': 'ONMS2000'})
+    assert store.load_all()['Name'].tolist() == ['Existing', 'Next']
@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from storage import (APPLICANT_COLUMNS, SQLiteApplicantStore, StorageError, atomic_write_excel,
+                     open_applicant_store)
+
+
+# Hand-entered books can have blank or repeated IDs; writes are keyed on
+# ID_Number, so opening the store must leave every row with its own.
+@pytest.mark.parametrize('backend', ['sqlite', 'excel'])
+def test_open_renumbers_blank_and_repeated_ids(backend, tmp_path):
+    book = pd.DataFrame({col: '' for col in APPLICANT_COLUMNS}, index=range(4))
+    book['Name'] = ['A', 'B', 'C', 'D']
+    book['ID_Number'] = ['', '', '310', '310']
+    workbook = str(tmp_path / 'onms_applicants.xlsx')
+    atomic_write_excel(book, workbook)
+    store = open_applicant_store(backend, str(tmp_path / 'onms_applicants.db'), workbook, columnar=False)
+    ids = store.load_all()['ID_Number']
+    assert ids.is_unique and (ids != '').all()
+    assert ids.tolist()[2] == '310'  # The first row with an ID keeps it
+    store.delete(ids[0])
+    assert store.load_all()['Name'].tolist() == ['B', 'C', 'D']
+
+
+def test_sqlite_refuses_ambiguous_writes(tmp_path):
+    store = SQLiteApplicantStore(str(tmp_path / 'onms_applicants.db'), columnar=False)
+    store.insert({'Name': 'A', 'ID_Number': 'ONMS0001'})
+    store.insert({'Name': 'B', 'ID_Number': 'ONMS0001'})
+    with pytest.raises(StorageError):
+        store.update('ONMS0001', {'Name': 'C'})
+    with pytest.raises(StorageError):
+        store.delete('ONMS0001')
+    assert store.load_all()['Name'].tolist() == ['A', 'B']